@@ -1,4 +1,5 @@
 import os
+import time
 from enum import Enum
 from dotenv import load_dotenv
 
@@ -11,7 +12,7 @@ load_dotenv()
 
 # Import chat protocols
 from chat_proto import chat_proto, struct_output_client_proto
-from nft_service import get_nft_info, NFTQueryRequest, NFTQueryResponse
+from nft_service import get_nft_info, get_mcp_client, close_mcp_client, NFTQueryRequest, NFTQueryResponse
 
 # Create the agent with chat protocol support
 agent = Agent(
@@ -48,16 +49,29 @@ async def handle_request(ctx: Context, sender: str, msg: NFTQueryRequest):
 agent.include(proto, publish_manifest=True)
 
 ### Health check protocol
-def agent_is_healthy() -> bool:
+HEALTH_CHECK_TTL = 30  # seconds a health result is reused before checking again
+
+# (monotonic time of the last check, its result)
+_last_health_check = (float("-inf"), False)
+
+async def agent_is_healthy() -> bool:
     """
     Check if the agent can connect to OpenSea MCP
     """
+    global _last_health_check
+    checked_at, healthy = _last_health_check
+    now = time.monotonic()
+    if now - checked_at < HEALTH_CHECK_TTL:
+        return healthy
+    
     try:
-        import asyncio
-        asyncio.run(get_nft_info("test"))
-        return True
+        mcp_client = await get_mcp_client()
+        # A real round trip each window; initialize() alone returns early once a session exists
+        healthy = await mcp_client.ping()
     except Exception:
-        return False
+        healthy = False
+    _last_health_check = (now, healthy)
+    return healthy
 
 class HealthCheck(Model):
     pass
@@ -78,7 +92,7 @@ health_protocol = QuotaProtocol(
 async def handle_health_check(ctx: Context, sender: str, msg: HealthCheck):
     status = HealthStatus.UNHEALTHY
     try:
-        if agent_is_healthy():
+        if await agent_is_healthy():
             status = HealthStatus.HEALTHY
     except Exception as err:
         ctx.logger.error(err)
@@ -90,6 +104,10 @@ agent.include(health_protocol, publish_manifest=True)
 agent.include(chat_proto, publish_manifest=True)
 agent.include(struct_output_client_proto, publish_manifest=True)
 
+@agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    ctx.logger.info("Etherius Chat Agent shutting down")
+    await close_mcp_client()
 
 if __name__ == "__main__":
     print("""
@@ -153,7 +153,8 @@ class AgentWallet:
         print(f"   From wallet: {self.wallet_address}")
         
         try:
-            response = self.session.post(url)
+            # x402_requests is a blocking requests session; run it off the event loop
+            response = await asyncio.to_thread(self.session.post, url)
             
             if response.status_code == 200:
                 print(f"✅ Payment successful!")
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from uuid import uuid4
 from typing import Any
@@ -24,6 +25,9 @@ AI_AGENT_ADDRESS = 'agent1q0h70caed8ax769shpemapzkyk65uscw4xwk6dc4t3emvp5jdcvqs9
 if not AI_AGENT_ADDRESS:
     raise ValueError("AI_AGENT_ADDRESS not set")
 
+# The structured output schema never changes, so generate it once instead of per message
+NFT_QUERY_SCHEMA = NFTQueryRequest.model_json_schema()
+
 
 def create_text_chat(text: str, end_session: bool = False) -> ChatMessage:
     content = [TextContent(type="text", text=text)]
@@ -55,10 +59,15 @@ class StructuredOutputResponse(Model):
 async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
     ctx.logger.info(f"Got a message from {sender}: {msg.content}")
     ctx.storage.set(str(ctx.session), sender)
-    await ctx.send(
-        sender,
-        ChatAcknowledgement(timestamp=datetime.utcnow(), acknowledged_msg_id=msg.msg_id),
-    )
+
+    # The acknowledgement and the structured-output requests go to different
+    # agents, so send them together once the content has been walked
+    sends = [
+        ctx.send(
+            sender,
+            ChatAcknowledgement(timestamp=datetime.utcnow(), acknowledged_msg_id=msg.msg_id),
+        )
+    ]
 
     for item in msg.content:
         if isinstance(item, StartSessionContent):
@@ -66,16 +75,19 @@ async def handle_message(ctx: Context, sender: str, msg: ChatMessage):
             continue
         elif isinstance(item, TextContent):
             ctx.logger.info(f"Got a message from {sender}: {item.text}")
-            ctx.storage.set(str(ctx.session), sender)
-            await ctx.send(
-                AI_AGENT_ADDRESS,
-                StructuredOutputPrompt(
-                    prompt=item.text, output_schema=NFTQueryRequest.schema()
-                ),
+            sends.append(
+                ctx.send(
+                    AI_AGENT_ADDRESS,
+                    StructuredOutputPrompt(
+                        prompt=item.text, output_schema=NFT_QUERY_SCHEMA
+                    ),
+                )
             )
         else:
             ctx.logger.info(f"Got unexpected content from {sender}")
 
+    await asyncio.gather(*sends)
+
 
 @chat_proto.on_message(ChatAcknowledgement)
 async def handle_ack(ctx: Context, sender: str, msg: ChatAcknowledgement):
@@ -104,7 +116,7 @@ async def handle_structured_output_response(
         )
         return
 
-    prompt = NFTQueryRequest.parse_obj(msg.output)
+    prompt = NFTQueryRequest.model_validate(msg.output)
 
     try:
         nft_info = await get_nft_info(prompt.query)
@@ -1,15 +1,20 @@
 import os
+import re
 import sys
 import json
 import httpx
+import orjson
 import time
-import hashlib
 import asyncio
-from typing import Dict, Any, Optional, List
+import hashlib
+import logging
+import secrets
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Any, Optional, List, Tuple
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 from uagents import Agent, Context, Model
-import requests
 from agent_wallet import AgentWallet
 
 # Ensure parent directory is importable
@@ -17,6 +22,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Agent configuration
 agent = Agent(
     name="etherius_agent_mik2025",
@@ -31,116 +38,65 @@ agent = Agent(
 # ASI:One Mini configuration
 ASI_ONE_API_KEY = os.getenv("ASI_ONE_API_KEY")
 ASI_ONE_URL = "https://api.asi1.ai/v1/chat/completions"
-
-# Payment configuration for NFT purchases
-PAYMENT_CONFIG = {
-    "receiving_address": os.getenv("X402_WALLET_ADDRESS"),
-    "network": "base-sepolia",
-    "default_price": 0.01,  # USDC
-    "auto_check_interval": 15,  # seconds
-    "max_check_time": 300  # 5 minutes max
+ASI_ONE_MODEL = os.getenv("ASI_ONE_MODEL", "asi1-mini")
+ASI_ONE_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {ASI_ONE_API_KEY}"
 }
+ASI_ONE_MAX_RETRIES = 3  # attempts per request when rate limited (429)
+OPENSEA_MAX_RETRIES = 3  # attempts per MCP tool call when rate limited (429)
+OPENSEA_MAX_RETRY_DELAY = 30  # seconds; longer Retry-After values are capped so queries don't stall
+
+# Recently answered queries, so repeat questions skip the MCP and ASI:One round trips
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_TTL = 60  # seconds
+
+# Tool-routing decisions are deterministic (temperature 0), so keep the most recent ones
+ROUTE_CACHE_SIZE = 1024
+
+# Summaries of identical (query, tool, result) triples, which ASI:One would only re-word
+SUMMARY_CACHE_SIZE = 1024
+SUMMARY_CACHE_TTL = 300  # seconds
+
+# OpenSea tool results (floor prices, volumes, listings) change slowly; reuse them briefly
+MCP_CACHE_SIZE = 256
+MCP_CACHE_TTL = 30  # seconds
+
+# Connection pool shared by every ASI:One, OpenSea MCP and x402 service request
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+X402_TIMEOUT = httpx.Timeout(10.0, connect=5.0)  # local payment service
+ASI_ONE_TIMEOUT = httpx.Timeout(60.0, connect=5.0)  # completions can take a while
+
+# Upper bound on requests in flight to each upstream, so bursts queue here instead of hitting rate limits
+ASI_ONE_CONCURRENCY = int(os.getenv("ASI_ONE_CONCURRENCY", "8"))
+OPENSEA_CONCURRENCY = int(os.getenv("OPENSEA_CONCURRENCY", "32"))
+
+# MCP initialize handshake; identical for every session, so serialize it once
+MCP_INITIALIZE_BODY = orjson.dumps({
+    "jsonrpc": "2.0",
+    "id": 0,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2025-06-18",
+        "capabilities": {},
+        "clientInfo": {"name": "etherius-simple", "version": "2.0"}
+    }
+})
+# MCP ping: the lightest request that still round-trips to the server within the session
+MCP_PING_BODY = orjson.dumps({"jsonrpc": "2.0", "id": 2, "method": "ping"})
 
-# Track active NFT purchases
-active_purchases = {}
-
-# Simple Models
-class ChatRequest(Model):
-    message: str
-
-class ChatResponse(Model):
-    response: str
-
-class BroadcastMessage(Model):
-    message: str
-    original_sender: str
-
-class AgentMessage(Model):
-    agent_name: str
-    message: str
-    timestamp: float
-
-class AgentMessagesResponse(Model):
-    messages: List[AgentMessage]
-
-class ImageUrlMessage(Model):
-    image_url: str
-    source: str
-
-class TvImageResponse(Model):
-    image_url: str
-    timestamp: float
-
-class MettaQueryRequest(Model):
-    query: str
+# x402 service endpoints; the per-payment URLs are bound str.format templates
+X402_CREATE_URL = "http://localhost:8402/payment/create"
+X402_STATUS_URL = "http://localhost:8402/payment/status/{}".format
+X402_PURCHASE_URL = "http://localhost:8402/nft/purchase/{}".format
 
+# System prompts are invariant across requests; build them once at import
+TOOL_ROUTER_SYSTEM_MESSAGE = {"role": "system", "content": "You generate OpenSea MCP API requests. Respond only with valid JSON!!, no ```, no markdown or extra text."}
+PARSER_SYSTEM_MESSAGE = {"role": "system", "content": "You parse NFT data and provide clear summaries."}
 
-class SimpleOpenSeaMCP:
-    """Minimal MCP client that uses GPT-4o for request/response handling"""
-    
-    def __init__(self, ctx: Context):
-        self._ctx = ctx
-        self.access_token = os.getenv("OPENSEA_MCP_TOKEN", "")
-        self.base_url = "https://mcp.opensea.io/mcp"
-        self.session_id = None
-        self._initialized = False
-        
-        if not self.access_token:
-            self._ctx.logger.warning("⚠️ OPENSEA_MCP_TOKEN not found. Set it in .env file.")
-    
-    async def initialize(self) -> bool:
-        """Initialize MCP session"""
-        if self._initialized:
-            return True
-            
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json, text/event-stream",
-            "Authorization": f"Bearer {self.access_token}"
-        }
-        
-        init_request = {
-            "jsonrpc": "2.0",
-            "id": 0,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2025-06-18",
-                "capabilities": {},
-                "clientInfo": {"name": "etherius-simple", "version": "2.0"}
-            }
-        }
-        
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(self.base_url, headers=headers, json=init_request)
-                if resp.status_code == 200:
-                    session_id = resp.headers.get("Mcp-Session-Id")
-                    if session_id:
-                        self.session_id = session_id
-                    self._initialized = True
-                    self._ctx.logger.info("✅ OpenSea MCP initialized")
-                    return True
-                else:
-                    self._ctx.logger.error(f"Failed to initialize: {resp.status_code}")
-                    return False
-        except Exception as e:
-            self._ctx.logger.error(f"Init error: {e}")
-            return False
-    
-    async def query_with_gpt(self, user_query: str, ctx: Context = None) -> str:
-        """Use ASI:One Mini to generate MCP request, execute it, and parse response"""
-        
-        if not ASI_ONE_API_KEY:
-            return "⚠️ ASI:One API key required. Set ASI_ONE_API_KEY in your .env file."
-        
-        if not self.access_token:
-            return "⚠️ OpenSea MCP token required. Set OPENSEA_MCP_TOKEN in your .env file."
-        
-        if not await self.initialize():
-            return "Failed to initialize OpenSea MCP session."
-        
-        # Step 1: Use ASI:One Mini to determine the right MCP tool and arguments
-        tool_prompt = f"""
+# User prompt templates, filled per request with str.format_map (literal braces are doubled)
+TOOL_ROUTER_PROMPT_TEMPLATE = """
 You are a tool router for OpenSea MCP. Choose the best tool and arguments to satisfy the user's request.
 Return ONLY a JSON object with keys "tool" and "args". No markdown, no code fences, no extra text.
 
@@ -206,102 +162,7 @@ User: "trending collections"
 {{"tool":"get_trending_collections","args":{{"timeframe":"ONE_DAY","limit":10}}}}
 """
 
-
-        try:
-            # Get ASI:One Mini to generate the MCP request
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {ASI_ONE_API_KEY}"
-            }
-            data = {
-                "model": "asi1-mini",
-                "messages": [
-                    {"role": "system", "content": "You generate OpenSea MCP API requests. Respond only with valid JSON!!, no ```, no markdown or extra text."},
-                    {"role": "user", "content": tool_prompt}
-                ],
-                "temperature": 0
-            }
-            response = requests.post(ASI_ONE_URL, headers=headers, json=data)
-            
-            # Check if request was successful
-            if response.status_code != 200:
-                self._ctx.logger.error(f"ASI:One API error: {response.status_code} - {response.text}")
-                return f"❌ ASI:One API error: {response.status_code}"
-            
-            response_json = response.json()
-            
-            # Check if response has expected structure
-            if 'choices' not in response_json or not response_json['choices']:
-                self._ctx.logger.error(f"Invalid ASI:One response structure: {response_json}")
-                return "❌ Invalid response from ASI:One Mini"
-            
-            # Clean up response content (remove markdown if present)
-            content = response_json['choices'][0]['message']['content'].strip()
-            if content.startswith("```"):
-                # Remove markdown code blocks
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            content = content.strip()
-            
-            tool_request = json.loads(content)
-            tool_name = tool_request.get("tool")
-            tool_args = tool_request.get("args", {})
-            
-            # Fix parameter names for OpenSea MCP compatibility
-            if "sort_by" in tool_args:
-                tool_args["sortBy"] = tool_args.pop("sort_by")
-            
-            self._ctx.logger.info(f"🤖 ASI:One Mini selected: {tool_name} with args: {tool_args}")
-            
-            # Add query parameter if missing for search tools (only for general search)
-            general_search_tools = ["search", "search_collections", "search_tokens"]
-            if tool_name in general_search_tools and not tool_args.get("query"):
-                # For general search tools, use the full query
-                self._ctx.logger.info(f"No query parameter found for {tool_name}, using user's input")
-                tool_args["query"] = user_query
-            elif tool_name == "search_items" and not tool_args.get("query"):
-                # For search_items, extract just the collection/item name, not the full query with filters
-                # This is a fallback - the prompt should have extracted it properly
-                self._ctx.logger.warning(f"No query for search_items, attempting to extract collection name")
-                # Try to extract collection name from common patterns
-                import re
-                # Look for known collection names or NFT mentions
-                collection_patterns = [
-                    r'(CryptoPunks?|Punks?)',
-                    r'(Bored Apes?|BAYC)',
-                    r'(Azuki)',
-                    r'(Pudgy Penguins?)',
-                    r'(Doodles?)',
-                    r'(CloneX)',
-                    r'(Moonbirds?)',
-                    r'(NFTs?)',
-                ]
-                for pattern in collection_patterns:
-                    match = re.search(pattern, user_query, re.IGNORECASE)
-                    if match:
-                        tool_args["query"] = match.group(1)
-                        self._ctx.logger.info(f"Extracted collection name: {tool_args['query']}")
-                        break
-                else:
-                    # If no pattern matched, use a generic term
-                    tool_args["query"] = "NFT"
-                    self._ctx.logger.warning("Could not extract collection name, using 'NFT' as fallback")
-            
-            # Always add includes for appropriate tools to get images
-            if tool_name in ["search", "search_items", "get_collection"]:
-                if "includes" not in tool_args:
-                    tool_args["includes"] = ["items"]
-                    self._ctx.logger.info(f"Added includes: ['items'] to {tool_name} for image data")
-            
-            # Step 2: Execute the MCP request
-            mcp_result = await self._execute_mcp_call(tool_name, tool_args)
-            
-            # Step 3: Use ASI:One Mini to parse and format the response
-            if "error" in mcp_result:
-                return f"❌ Error: {mcp_result['error']}"
-            
-            parse_prompt = f"""
+PARSER_PROMPT_TEMPLATE = """
 You are an NFT & token analyst. Read the OpenSea MCP response and write a concise, factual summary.
 
 USER QUESTION:
@@ -311,7 +172,7 @@ MCP TOOL USED:
 {tool_name}
 
 RAW RESPONSE (JSON):
-{json.dumps(mcp_result, indent=2)}
+{raw_response}
 
 GUIDELINES:
 - If the tool returned collections: include name, slug, chain, floor price, 1d/7d volume/sales if present, supply/owners if present. Note trend arrows (↑/↓) only if explicit in data.
@@ -334,65 +195,456 @@ OUTPUT:
 Plain text only. No JSON. No code fences.
 """
 
+# MCP tool groups used when filling in missing arguments
+GENERAL_SEARCH_TOOLS = frozenset({"search", "search_collections", "search_tokens"})
+IMAGE_TOOLS = frozenset({"search", "search_items", "get_collection"})
+LIST_TOOLS = frozenset({
+    "search", "search_items", "search_collections", "search_tokens",
+    "get_trending_collections", "get_top_collections",
+})
+
+# Bound list results at the source so OpenSea never sends (and we never parse) unbounded pages
+DEFAULT_RESULT_LIMIT = 20
+MAX_RESULT_LIMIT = 50
+
+# Fixed-intent queries (normalized) that need no ASI:One routing call; trending args follow the
+# router prompt's example, and top collections get the page size a routed call is clamped to
+KNOWN_ROUTES = {
+    "trending collections": ("get_trending_collections", {"timeframe": "ONE_DAY", "limit": 10}),
+    "trending nft collections": ("get_trending_collections", {"timeframe": "ONE_DAY", "limit": 10}),
+    "top collections": ("get_top_collections", {"limit": DEFAULT_RESULT_LIMIT}),
+    "top nft collections": ("get_top_collections", {"limit": DEFAULT_RESULT_LIMIT}),
+}
 
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {ASI_ONE_API_KEY}"
-            }
-            data = {
-                "model": "asi1-mini",
-                "messages": [
-                    {"role": "system", "content": "You parse NFT data and provide clear summaries."},
-                    {"role": "user", "content": parse_prompt}
-                ]
-            }
-            response = requests.post(ASI_ONE_URL, headers=headers, json=data)
-            
-            # Check if request was successful
-            if response.status_code != 200:
-                self._ctx.logger.error(f"ASI:One API error: {response.status_code} - {response.text}")
-                return f"❌ ASI:One API error: {response.status_code}"
-            
-            response_json = response.json()
-            
-            # Check if response has expected structure
-            if 'choices' not in response_json or not response_json['choices']:
-                self._ctx.logger.error(f"Invalid ASI:One response structure: {response_json}")
-                return "❌ Invalid response from ASI:One Mini"
-            
-            parsed_response = response_json['choices'][0]['message']['content']
-            
-            # Broadcast parsed response to TV agent if context is available
-            if ctx and tv_agent_address:
-                try:
-                    broadcast_msg = BroadcastMessage(
-                        message=parsed_response,
-                        original_sender="etherius_parsed"
-                    )
-                    await ctx.send(tv_agent_address, broadcast_msg)
-                    self._ctx.logger.info("📺 Broadcasted parsed NFT data to TV agent")
-                except Exception as e:
-                    self._ctx.logger.error(f"Failed to broadcast to TV agent: {e}")
+# MCP text payloads that mean "no matches"
+EMPTY_RESULT_TEXTS = frozenset({"", "[]", "{}", "null"})
+NO_RESULTS_MESSAGE = (
+    "No matching results found on OpenSea for that request. "
+    "Try broadening it: drop a price or status filter, try another chain, or name a collection."
+)
+
+# Known collection names / NFT mentions for the search_items fallback, one group per entry in
+# priority order; when a query names several, the lowest group number wins, not the first in the text
+COLLECTION_PATTERN = re.compile(
+    r'(CryptoPunks?|Punks?)|(Bored Apes?|BAYC)|(Azuki)|(Pudgy Penguins?)|(Doodles?)|(CloneX)|(Moonbirds?)|(NFTs?)',
+    re.IGNORECASE
+)
+
+# Payment configuration for NFT purchases
+PAYMENT_CONFIG = {
+    "receiving_address": os.getenv("X402_WALLET_ADDRESS"),
+    "network": "base-sepolia",
+    "default_price": 0.01,  # USDC
+    "auto_check_interval": 15,  # seconds
+    "max_check_time": 300  # 5 minutes max
+}
+
+# Track active NFT purchases, oldest first (insertion order follows start_time)
+active_purchases = {}
+MAX_TRACKED_PURCHASES = 1000
+PURCHASE_RETENTION = 3600  # seconds a purchase stays queryable; well past max_check_time
+PENDING_STATUSES = frozenset({"awaiting_payment", "awaiting_funding"})
+
+# Simple Models
+class ChatRequest(Model):
+    message: str
+
+class ChatResponse(Model):
+    response: str
+
+class BroadcastMessage(Model):
+    message: str
+    original_sender: str
+
+class AgentMessage(Model):
+    agent_name: str
+    message: str
+    timestamp: float
+
+class AgentMessagesResponse(Model):
+    messages: List[AgentMessage]
+
+class ImageUrlMessage(Model):
+    image_url: str
+    source: str
+
+class TvImageResponse(Model):
+    image_url: str
+    timestamp: float
+
+class MettaQueryRequest(Model):
+    query: str
+
+
+def is_empty_mcp_result(result: Dict[str, Any]) -> bool:
+    """True when an MCP tool result carries no data (no content, or only empty text)"""
+    if not result:
+        return True
+    if "content" not in result:
+        return False
+    return all(
+        item.get("type") == "text" and item.get("text", "").strip() in EMPTY_RESULT_TEXTS
+        for item in result["content"] or ()
+    )
+
+
+# Keep-alive HTTP client shared across the agent, created inside the running loop
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return http_client
+
+async def close_http_client():
+    """Close the shared HTTP client's connection pool on agent shutdown"""
+    if http_client and not http_client.is_closed:
+        await http_client.aclose()
+
+
+class SimpleOpenSeaMCP:
+    """Minimal MCP client that uses GPT-4o for request/response handling"""
+    
+    def __init__(self, ctx: Context):
+        self._ctx = ctx
+        self.access_token = os.getenv("OPENSEA_MCP_TOKEN", "")
+        self.base_url = "https://mcp.opensea.io/mcp"
+        self.session_id = None
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
+        self._asi_one_slots = asyncio.Semaphore(ASI_ONE_CONCURRENCY)
+        self._opensea_slots = asyncio.Semaphore(OPENSEA_CONCURRENCY)
+        # Request headers are fixed per client; the session ID is added once initialized
+        self._headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+            "Authorization": f"Bearer {self.access_token}"
+        }
+        self.cache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.route_cache: OrderedDict = OrderedDict()
+        self.mcp_cache = TTLCache(maxsize=MCP_CACHE_SIZE, ttl=MCP_CACHE_TTL)
+        self.summary_cache = TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL)
+        self._mcp_inflight: Dict[tuple, asyncio.Task] = {}
+        self._query_inflight: Dict[str, asyncio.Task] = {}
+        
+        if not self.access_token:
+            self._ctx.logger.warning("⚠️ OPENSEA_MCP_TOKEN not found. Set it in .env file.")
+        
+        # Credentials don't change while running, so decide once whether queries can run
+        if not ASI_ONE_API_KEY:
+            self._config_error = "⚠️ ASI:One API key required. Set ASI_ONE_API_KEY in your .env file."
+        elif not self.access_token:
+            self._config_error = "⚠️ OpenSea MCP token required. Set OPENSEA_MCP_TOKEN in your .env file."
+        else:
+            self._config_error = None
+    
+    async def initialize(self) -> bool:
+        """Initialize MCP session"""
+        if self._initialized:
+            return True
+        
+        # Queries arriving before the session is ready wait on the one handshake in flight
+        async with self._init_lock:
+            if self._initialized:
+                return True
+            return await self._open_session()
+    
+    async def ping(self) -> bool:
+        """Check that OpenSea MCP answers a ping on our session, opening it first if needed"""
+        if not await self.initialize():
+            return False
+        try:
+            async with self._opensea_slots:
+                resp = await get_http_client().post(self.base_url, headers=self._headers, content=MCP_PING_BODY)
+        except Exception as e:
+            self._ctx.logger.warning(f"MCP ping failed: {e}")
+            return False
+        return resp.status_code == 200
+    
+    async def _open_session(self) -> bool:
+        """Send the MCP initialize handshake"""
+        try:
+            resp = await get_http_client().post(self.base_url, headers=self._headers, content=MCP_INITIALIZE_BODY)
+            if resp.status_code == 200:
+                session_id = resp.headers.get("Mcp-Session-Id")
+                if session_id:
+                    self.session_id = session_id
+                    self._headers["Mcp-Session-Id"] = session_id
+                self._initialized = True
+                self._ctx.logger.info("✅ OpenSea MCP initialized")
+                return True
+            else:
+                self._ctx.logger.error(f"Failed to initialize: {resp.status_code}")
+                return False
+        except Exception as e:
+            self._ctx.logger.error(f"Init error: {e}")
+            return False
+    
+    async def query_with_gpt(self, user_query: str, ctx: Context = None) -> str:
+        """Use ASI:One Mini to generate MCP request, execute it, and parse response"""
+        
+        if self._config_error:
+            return self._config_error
+        
+        if not await self.initialize():
+            return "Failed to initialize OpenSea MCP session."
+        
+        cache_key = " ".join(user_query.lower().split())
+        cached_response = self.cache.get(cache_key)
+        if cached_response is not None:
+            self.cache_hits += 1
+            self._ctx.logger.info(f"⚡ Query cache hit ({self.cache_hits} hits / {self.cache_misses} misses)")
+            await self._broadcast_to_tv(ctx, cached_response)
+            return cached_response
+        self.cache_misses += 1
+        
+        # Identical queries already being answered share that work instead of starting another
+        task = self._query_inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._answer_query(user_query, cache_key))
+            self._query_inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._query_inflight.pop(cache_key, None))
+        else:
+            self._ctx.logger.info("⏳ Joining in-flight query")
+        response, answered = await asyncio.shield(task)
+        if answered:
+            await self._broadcast_to_tv(ctx, response)
+        return response
+    
+    async def _answer_query(self, user_query: str, cache_key: str) -> Tuple[str, bool]:
+        """Route, execute and summarise a query; the flag is False when it ended in an error"""
+        
+        # Step 1: Use ASI:One Mini to determine the right MCP tool and arguments
+        try:
+            known = KNOWN_ROUTES.get(cache_key)
+            routed = self.route_cache.get(cache_key)
+            if known is not None:
+                tool_name, tool_args = known
+                self._ctx.logger.info(f"⚡ Known query, routing locally to {tool_name}")
+            elif routed is not None:
+                self.route_cache.move_to_end(cache_key)
+                tool_name, tool_args = routed
+                self._ctx.logger.info(f"⚡ Reusing routing decision: {tool_name} with args: {tool_args}")
+            else:
+                # Get ASI:One Mini to generate the MCP request
+                data = {
+                    "model": ASI_ONE_MODEL,
+                    "messages": [
+                        TOOL_ROUTER_SYSTEM_MESSAGE,
+                        {"role": "user", "content": TOOL_ROUTER_PROMPT_TEMPLATE.format_map({"user_query": user_query})}
+                    ],
+                    "temperature": 0
+                }
+                response = await self._post_asi_one(data)
+                
+                # Check if request was successful
+                if response.status_code != 200:
+                    self._ctx.logger.error(f"ASI:One API error: {response.status_code} - {response.text}")
+                    return f"❌ ASI:One API error: {response.status_code}", False
+                
+                response_json = orjson.loads(response.content)
+                
+                # Check if response has expected structure
+                choices = response_json.get('choices')
+                if not choices:
+                    self._ctx.logger.error(f"Invalid ASI:One response structure: {response_json}")
+                    return "❌ Invalid response from ASI:One Mini", False
+                
+                # Clean up response content (remove markdown if present)
+                content = choices[0]['message']['content'].strip()
+                if content.startswith("```"):
+                    # Remove markdown code blocks
+                    content = content.split("```")[1]
+                    if content.startswith("json"):
+                        content = content[4:]
+                content = content.strip()
+                
+                tool_request = json.loads(content)
+                tool_name = tool_request.get("tool")
+                tool_args = tool_request.get("args", {})
+                
+                # Fix parameter names for OpenSea MCP compatibility
+                if "sort_by" in tool_args:
+                    tool_args["sortBy"] = tool_args.pop("sort_by")
+                
+                self._ctx.logger.info(f"🤖 ASI:One Mini selected: {tool_name} with args: {tool_args}")
+                
+                # Add query parameter if missing for search tools (only for general search)
+                if tool_name in GENERAL_SEARCH_TOOLS and not tool_args.get("query"):
+                    # For general search tools, use the full query
+                    self._ctx.logger.info(f"No query parameter found for {tool_name}, using user's input")
+                    tool_args["query"] = user_query
+                elif tool_name == "search_items" and not tool_args.get("query"):
+                    # For search_items, extract just the collection/item name, not the full query with filters
+                    # This is a fallback - the prompt should have extracted it properly
+                    self._ctx.logger.warning(f"No query for search_items, attempting to extract collection name")
+                    # Try to extract collection name from common patterns
+                    match = min(COLLECTION_PATTERN.finditer(user_query), key=lambda m: m.lastindex, default=None)
+                    if match:
+                        tool_args["query"] = match.group()
+                        self._ctx.logger.info(f"Extracted collection name: {tool_args['query']}")
+                    else:
+                        # If no pattern matched, use a generic term
+                        tool_args["query"] = "NFT"
+                        self._ctx.logger.warning("Could not extract collection name, using 'NFT' as fallback")
+                
+                # Always add includes for appropriate tools to get images
+                if tool_name in IMAGE_TOOLS:
+                    if "includes" not in tool_args:
+                        tool_args["includes"] = ["items"]
+                        self._ctx.logger.info(f"Added includes: ['items'] to {tool_name} for image data")
+                
+                if tool_name in LIST_TOOLS:
+                    limit = tool_args.get("limit")
+                    if not isinstance(limit, int) or limit <= 0:
+                        tool_args["limit"] = DEFAULT_RESULT_LIMIT
+                    elif limit > MAX_RESULT_LIMIT:
+                        tool_args["limit"] = MAX_RESULT_LIMIT
+                
+                self.route_cache[cache_key] = (tool_name, tool_args)
+                if len(self.route_cache) > ROUTE_CACHE_SIZE:
+                    self.route_cache.popitem(last=False)
+                
+            # Step 2: Execute the MCP request
+            mcp_result = await self._execute_mcp_call(tool_name, tool_args)
+                
+            # Step 3: Use ASI:One Mini to parse and format the response
+            if "error" in mcp_result:
+                return f"❌ Error: {mcp_result['error']}", False
+                
+            # Nothing to summarise, so don't spend an ASI:One call on it
+            if is_empty_mcp_result(mcp_result):
+                self._ctx.logger.info(f"Empty result from {tool_name}, skipping ASI:One parse")
+                return NO_RESULTS_MESSAGE, False
+                
+            # The same question over the same OpenSea data gets the same summary
+            raw_response = json.dumps(mcp_result, separators=(",", ":"), ensure_ascii=False)
+            summary_key = (
+                ASI_ONE_MODEL, cache_key, tool_name,
+                hashlib.blake2b(raw_response.encode(), digest_size=16).digest()
+            )
+            parsed_response = self.summary_cache.get(summary_key)
+            if parsed_response is not None:
+                self._ctx.logger.info("⚡ Reusing summary for unchanged OpenSea data")
+            else:
+                parse_prompt = PARSER_PROMPT_TEMPLATE.format_map({
+                    "user_query": user_query,
+                    "tool_name": tool_name,
+                    "raw_response": raw_response
+                })
+                data = {
+                    "model": ASI_ONE_MODEL,
+                    "messages": [
+                        PARSER_SYSTEM_MESSAGE,
+                        {"role": "user", "content": parse_prompt}
+                    ]
+                }
+                response = await self._post_asi_one(data)
+                
+                # Check if request was successful
+                if response.status_code != 200:
+                    self._ctx.logger.error(f"ASI:One API error: {response.status_code} - {response.text}")
+                    return f"❌ ASI:One API error: {response.status_code}", False
+                
+                response_json = orjson.loads(response.content)
+                
+                # Check if response has expected structure
+                choices = response_json.get('choices')
+                if not choices:
+                    self._ctx.logger.error(f"Invalid ASI:One response structure: {response_json}")
+                    return "❌ Invalid response from ASI:One Mini", False
+                
+                parsed_response = choices[0]['message']['content']
+                self.summary_cache[summary_key] = parsed_response
             
-            return parsed_response
+            self.cache[cache_key] = parsed_response
+            return parsed_response, True
             
         except json.JSONDecodeError as e:
-            return f"Failed to parse GPT response: {e}"
+            return f"Failed to parse GPT response: {e}", False
         except Exception as e:
             self._ctx.logger.error(f"Error in GPT query: {e}")
-            return f"Error processing request: {str(e)}"
+            return f"Error processing request: {str(e)}", False
+    
+    async def _broadcast_to_tv(self, ctx: Optional[Context], parsed_response: str):
+        """Broadcast parsed response to TV agent if context is available"""
+        if not ctx:
+            return
+        try:
+            broadcast_msg = BroadcastMessage(
+                message=parsed_response,
+                original_sender="etherius_parsed"
+            )
+            await ctx.send(TV_ADDRESS, broadcast_msg)
+            self._ctx.logger.info("📺 Broadcasted parsed NFT data to TV agent")
+        except Exception as e:
+            self._ctx.logger.error(f"Failed to broadcast to TV agent: {e}")
+    
+    async def _post_asi_one(self, data: Dict[str, Any]) -> httpx.Response:
+        """POST a chat completion to ASI:One, backing off exponentially on rate limits"""
+        
+        client = get_http_client()
+        body = orjson.dumps(data)
+        for attempt in range(ASI_ONE_MAX_RETRIES):
+            # Hold a slot only while the request is on the wire, not during the backoff
+            async with self._asi_one_slots:
+                response = await client.post(ASI_ONE_URL, headers=ASI_ONE_HEADERS, content=body, timeout=ASI_ONE_TIMEOUT)
+            if response.status_code != 429 or attempt == ASI_ONE_MAX_RETRIES - 1:
+                break
+            delay = 2 ** attempt
+            self._ctx.logger.warning(f"ASI:One rate limited, retrying in {delay}s")
+            await asyncio.sleep(delay)
+        return response
     
     async def _execute_mcp_call(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute an OpenSea MCP tool call"""
+        """Execute an OpenSea MCP tool call, reusing a recent identical result"""
         
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json, text/event-stream",
-            "Authorization": f"Bearer {self.access_token}"
-        }
+        cache_key = (tool_name, json.dumps(args, sort_keys=True, default=str))
+        cached_result = self.mcp_cache.get(cache_key)
+        if cached_result is not None:
+            self._ctx.logger.info(f"⚡ MCP cache hit for {tool_name}")
+            return cached_result
+        
+        # Identical calls already on the wire share that request instead of sending another
+        task = self._mcp_inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_mcp_result(tool_name, args, cache_key))
+            self._mcp_inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._mcp_inflight.pop(cache_key, None))
+        else:
+            self._ctx.logger.info(f"⏳ Joining in-flight MCP call for {tool_name}")
+        # Shield so one caller giving up doesn't cancel the request for the others
+        return await asyncio.shield(task)
+    
+    async def _fetch_mcp_result(self, tool_name: str, args: Dict[str, Any], cache_key: tuple) -> Dict[str, Any]:
+        """Run an MCP tool call and cache a successful result"""
+        result = await self._call_mcp_tool(tool_name, args)
+        if "error" not in result:
+            self.mcp_cache[cache_key] = result
+        return result
+    
+    async def _post_mcp(self, body: bytes) -> httpx.Response:
+        """POST to OpenSea MCP, backing off on rate limits for at most OPENSEA_MAX_RETRY_DELAY seconds per retry"""
         
-        if self.session_id:
-            headers["Mcp-Session-Id"] = self.session_id
+        client = get_http_client()
+        for attempt in range(OPENSEA_MAX_RETRIES):
+            async with self._opensea_slots:
+                resp = await client.post(self.base_url, headers=self._headers, content=body)
+            if resp.status_code != 429 or attempt == OPENSEA_MAX_RETRIES - 1:
+                break
+            # Retry-After may also be an HTTP date; fall back to exponential backoff then
+            retry_after = resp.headers.get("retry-after", "")
+            delay = min(int(retry_after), OPENSEA_MAX_RETRY_DELAY) if retry_after.isdigit() else 2 ** attempt
+            self._ctx.logger.warning(f"OpenSea MCP rate limited, retrying in {delay}s")
+            await asyncio.sleep(delay)
+        return resp
+    
+    async def _call_mcp_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a tools/call request to OpenSea MCP"""
         
         request = {
             "jsonrpc": "2.0",
@@ -402,39 +654,37 @@ Plain text only. No JSON. No code fences.
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(self.base_url, headers=headers, json=request)
+            resp = await self._post_mcp(orjson.dumps(request))
+            
+            if resp.status_code == 200:
+                # Handle SSE response
+                content_type = resp.headers.get("content-type", "").lower()
                 
-                if resp.status_code == 200:
-                    # Handle SSE response
-                    content_type = resp.headers.get("content-type", "").lower()
-                    
-                    if "text/event-stream" in content_type:
-                        # Parse SSE format
-                        text = resp.text
-                        for message in text.split('\n\n'):
-                            for line in message.split('\n'):
-                                if line.startswith('data:'):
-                                    try:
-                                        data = json.loads(line[5:].strip())
-                                        if "result" in data:
-                                            return data["result"]
-                                        elif "error" in data:
-                                            return {"error": data["error"]}
-                                    except:
-                                        continue
-                        return {"error": "No valid data in SSE response"}
-                    else:
-                        # Regular JSON response
-                        data = resp.json()
+                if "text/event-stream" in content_type:
+                    # Parse SSE format: scan data lines once, event boundaries don't matter here
+                    for line in resp.text.splitlines():
+                        if not line.startswith('data:'):
+                            continue
+                        try:
+                            data = orjson.loads(line[5:])
+                        except orjson.JSONDecodeError:
+                            continue
                         if "result" in data:
                             return data["result"]
                         elif "error" in data:
                             return {"error": data["error"]}
-                        return {"error": "Invalid response format"}
+                    return {"error": "No valid data in SSE response"}
                 else:
-                    return {"error": f"HTTP {resp.status_code}"}
-                    
+                    # Regular JSON response
+                    data = orjson.loads(resp.content)
+                    if "result" in data:
+                        return data["result"]
+                    elif "error" in data:
+                        return {"error": data["error"]}
+                    return {"error": "Invalid response format"}
+            else:
+                return {"error": f"HTTP {resp.status_code}"}
+                
         except Exception as e:
             return {"error": str(e)}
 
@@ -444,18 +694,73 @@ Plain text only. No JSON. No code fences.
 
 mcp_client: Optional[SimpleOpenSeaMCP] = None
 
-# Addresses of the three receiver agents (will be set on startup)
-katrik_agent_address = None
-vitalik_agent_address = None
-tv_agent_address = None
-metta_agent_address = None
+# Background MCP handshake started on startup; held here so it can't be garbage-collected mid-flight
+mcp_warmup_task: Optional[asyncio.Task] = None
+
+def log_mcp_warmup(ctx: Context, task: asyncio.Task):
+    """Report how the startup MCP handshake went, retrieving any exception it raised"""
+    if task.cancelled():
+        ctx.logger.warning("⚠️ MCP warm-up cancelled")
+    elif task.exception() is not None:
+        ctx.logger.error(f"MCP warm-up failed: {task.exception()}")
+    elif task.result():
+        ctx.logger.info("✅ OpenSea MCP session ready")
+    else:
+        ctx.logger.warning("⚠️ MCP warm-up did not open a session; the first query will retry")
+
+# Addresses of the receiver agents
+KATRIK_ADDRESS = "agent1qw5tlakv4cqc8jztkksfz5rlkld74v0dcnkl46tcuvyrxwk9s6dzwryk9lf"
+VITALIK_ADDRESS = "agent1qwel00zmglnll707lhle9nvnsntqcmahvya5wsa0vyd42sy26sz0wxqp2vs"
+TV_ADDRESS = "agent1qgydk7m0ghhcf0l6kme7enwlkxswvzlcwqg8epwaexs259re94cdg07kzr2"
+METTA_ADDRESS = "agent1q0qs49vxucg494w3m3405uay4fjyf40q8mr9k73wftgnjqg2zukuwyx33jp"
+
+# Agents that receive every user message
+BROADCAST_TARGETS = (KATRIK_ADDRESS, VITALIK_ADDRESS, TV_ADDRESS)
+
+# Display names keyed by agent address
+AGENT_NAMES = {
+    KATRIK_ADDRESS: "Katrik",
+    VITALIK_ADDRESS: "Vitalik",
+    TV_ADDRESS: "TV",
+    METTA_ADDRESS: "MeTTa",
+}
 
 # Agent wallet for x402 payments
 agent_wallet = None
 
-# Store recent agent messages (keep last 50)
-agent_messages: List[AgentMessage] = []
+# Reply to the "wallet" command; the wallet doesn't change after startup, so it is built there once
+wallet_response: Optional[ChatResponse] = None
+
+# Store recent agent messages in a ring buffer (keeps last 50, oldest drop off)
 MAX_MESSAGES = 50
+agent_messages: Deque[AgentMessage] = deque(maxlen=MAX_MESSAGES)
+
+def record_agent_message(agent_name: str, message: str):
+    """Append a message to the history; fields are built here, so skip validation"""
+    agent_messages.append(AgentMessage.model_construct(
+        agent_name=agent_name,
+        message=message,
+        timestamp=time.time()
+    ))
+
+def make_room_for_purchase() -> bool:
+    """
+    Free a slot in active_purchases when it is full
+
+    Only purchases that are settled (not in PENDING_STATUSES) or past PURCHASE_RETENTION are
+    dropped, oldest first, so new buys never push out a payment that is still being checked.
+
+    Returns:
+        True if a new purchase can be tracked, False if every tracked purchase is still pending
+    """
+    if len(active_purchases) < MAX_TRACKED_PURCHASES:
+        return True
+    forget_before = time.monotonic() - PURCHASE_RETENTION
+    for payment_id, purchase in active_purchases.items():
+        if purchase["status"] not in PENDING_STATUSES or purchase["start_time"] <= forget_before:
+            del active_purchases[payment_id]
+            return True
+    return False
 
 # Store current TV image
 current_tv_image = {
@@ -465,21 +770,15 @@ current_tv_image = {
 
 @agent.on_event("startup")
 async def startup(ctx: Context):
-    global mcp_client, katrik_agent_address, vitalik_agent_address, tv_agent_address, metta_agent_address, agent_wallet
+    global mcp_client, mcp_warmup_task, agent_wallet, wallet_response
     ctx.logger.info("🌟 Simplified Etherius Agent Starting")
     ctx.logger.info(f"📍 Address: {agent.address}")
     ctx.logger.info("🤖 Using ASI:One Mini for intelligent NFT queries")
     
-    # Use the actual agent addresses
-    katrik_agent_address = "agent1qw5tlakv4cqc8jztkksfz5rlkld74v0dcnkl46tcuvyrxwk9s6dzwryk9lf"
-    vitalik_agent_address = "agent1qwel00zmglnll707lhle9nvnsntqcmahvya5wsa0vyd42sy26sz0wxqp2vs"
-    tv_agent_address = "agent1qgydk7m0ghhcf0l6kme7enwlkxswvzlcwqg8epwaexs259re94cdg07kzr2"
-    metta_agent_address = "agent1q0qs49vxucg494w3m3405uay4fjyf40q8mr9k73wftgnjqg2zukuwyx33jp"  # MeTTa agent address
-    
-    ctx.logger.info(f"📡 Will broadcast to Katrik: {katrik_agent_address}")
-    ctx.logger.info(f"📡 Will broadcast to Vitalik: {vitalik_agent_address}")
-    ctx.logger.info(f"📡 Will broadcast to TV: {tv_agent_address}")
-    ctx.logger.info(f"🧠 Will send MeTTa queries to: {metta_agent_address}")
+    ctx.logger.info(f"📡 Will broadcast to Katrik: {KATRIK_ADDRESS}")
+    ctx.logger.info(f"📡 Will broadcast to Vitalik: {VITALIK_ADDRESS}")
+    ctx.logger.info(f"📡 Will broadcast to TV: {TV_ADDRESS}")
+    ctx.logger.info(f"🧠 Will send MeTTa queries to: {METTA_ADDRESS}")
     
     # Check if API key is configured
     if not ASI_ONE_API_KEY:
@@ -488,6 +787,10 @@ async def startup(ctx: Context):
         ctx.logger.info("✅ ASI:One API key configured")
     
     mcp_client = SimpleOpenSeaMCP(ctx)
+    if mcp_client.access_token:
+        # Open the MCP session in the background so the first query skips the handshake
+        mcp_warmup_task = asyncio.create_task(mcp_client.initialize())
+        mcp_warmup_task.add_done_callback(lambda task: log_mcp_warmup(ctx, task))
     
     # Initialize agent wallet for x402 payments
     ctx.logger.info("💰 Initializing agent wallet...")
@@ -496,57 +799,68 @@ async def startup(ctx: Context):
     wallet_info = agent_wallet.get_wallet_info()
     ctx.logger.info(f"💳 Agent wallet ready: {wallet_info['address'][:10]}...")
     ctx.logger.info(f"   Type: {wallet_info['type']}, Network: {wallet_info['network']}")
+    wallet_response = ChatResponse(response=f"""
+💰 **Agent Wallet Information**
+
+**Address:** `{wallet_info['address']}`
+**Type:** {wallet_info['type']}
+**Network:** {wallet_info['network']}
+**Status:** {'Ready' if wallet_info['ready'] else 'Not Ready'}
+
+**Check Balance:** https://sepolia.basescan.org/address/{wallet_info['address']}
+
+To fund: Send USDC to the address above on Base Sepolia network.
+""")
     
     ctx.logger.info("✨ Ready!")
 
 @agent.on_rest_post("/chat", ChatRequest, ChatResponse)
 async def chat_endpoint(ctx: Context, req: ChatRequest) -> ChatResponse:
     """Chat endpoint that routes MeTTa queries, handles NFT purchases, or uses ASI:One Mini for OpenSea queries"""
-    global agent_messages, active_purchases
+    global active_purchases
     ctx.logger.info(f"💬 Chat: {req.message}")
     
+    # Split off the leading command word once instead of lowercasing the message per branch
+    command, separator, argument = req.message.partition(" ")
+    command = command.lower()
+    argument = argument.strip()
+    
     # Handle buy requests for NFT purchases
-    if req.message.lower().startswith("buy "):
-        nft_query = req.message[4:].strip()
+    if command == "buy" and separator:
+        nft_query = argument
         ctx.logger.info(f"🛒 NFT purchase request: {nft_query}")
         
         # Generate unique payment ID
-        payment_id = hashlib.sha256(f"{nft_query}{time.time()}".encode()).hexdigest()[:8]
+        payment_id = secrets.token_hex(4)
         
-        # Get NFT details using existing OpenSea MCP
-        nft_info = await mcp_client.query_with_gpt(f"get details and price for {nft_query}", ctx)
+        # Get NFT details using existing OpenSea MCP and create the x402 payment
+        # request concurrently; neither depends on the other
+        nft_info, x402_payment_id = await asyncio.gather(
+            mcp_client.query_with_gpt(f"get details and price for {nft_query}", ctx),
+            create_x402_payment(ctx, nft_query)
+        )
+        if x402_payment_id:
+            payment_id = x402_payment_id
         
-        # Create payment request via x402 service
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                payment_response = await client.post(
-                    "http://localhost:8402/payment/create",
-                    params={"nft_name": nft_query, "price": PAYMENT_CONFIG["default_price"]}
-                )
-                
-                if payment_response.status_code == 200:
-                    payment_data = payment_response.json()
-                    payment_id = payment_data["payment_id"]
-                    ctx.logger.info(f"Created x402 payment request: {payment_id}")
-        except Exception as e:
-            ctx.logger.error(f"Failed to create x402 payment request: {e}")
+        # Checked right before storing, with no await in between, so concurrent buys honour the cap
+        if not make_room_for_purchase():
+            ctx.logger.warning("⚠️ Purchase table full of pending payments, rejecting new buy")
+            return ChatResponse(response="❌ Too many purchases are awaiting payment right now. Please try again in a few minutes.")
         
         # Store purchase details
+        price = PAYMENT_CONFIG["default_price"]
         active_purchases[payment_id] = {
             "nft": nft_query,
-            "price": PAYMENT_CONFIG["default_price"],
-            "start_time": time.time(),
+            "price": price,
+            "start_time": time.monotonic(),  # only compared against other monotonic readings
             "status": "awaiting_payment"
         }
         
-        # Start auto-checker immediately
-        asyncio.create_task(auto_check_payment(ctx, payment_id))
-        
         response = f"""
 💳 **NFT Purchase Started - x402 Payment System**
 
 **NFT:** {nft_query}
-**Price:** ${PAYMENT_CONFIG["default_price"]} USDC
+**Price:** ${price} USDC
 **Payment ID:** `{payment_id}`
 **Network:** {PAYMENT_CONFIG["network"]}
 
@@ -564,7 +878,7 @@ async def chat_endpoint(ctx: Context, req: ChatRequest) -> ChatResponse:
 • Then type: `verify 0xYourTxHash`
 
 **Option 3: x402 Portal**
-• Visit: `http://localhost:8402/nft/purchase/{payment_id}`
+• Visit: `{X402_PURCHASE_URL(payment_id)}`
 
 ✨ **Agent wallet enables proper x402 payments!**
 
@@ -572,22 +886,13 @@ async def chat_endpoint(ctx: Context, req: ChatRequest) -> ChatResponse:
 """
         
         # Store and return response
-        agent_msg = AgentMessage(
-            agent_name="Etherius",
-            message=response,
-            timestamp=time.time()
-        )
-        agent_messages.append(agent_msg)
-        
-        # Keep only last MAX_MESSAGES
-        if len(agent_messages) > MAX_MESSAGES:
-            agent_messages = agent_messages[-MAX_MESSAGES:]
+        record_agent_message("Etherius", response)
         
         return ChatResponse(response=response)
     
     # Handle "execute" command for agent wallet x402 payments
-    elif req.message.lower().startswith("execute "):
-        payment_id = req.message[8:].strip()
+    elif command == "execute" and separator:
+        payment_id = argument
         
         if payment_id not in active_purchases:
             return ChatResponse(response=f"❌ Payment ID `{payment_id}` not found")
@@ -617,16 +922,7 @@ Your NFT has been transferred! The agent successfully used x402 to complete the
 """
                 
                 # Store message for history
-                agent_msg = AgentMessage(
-                    agent_name="Etherius",
-                    message=success_msg,
-                    timestamp=time.time()
-                )
-                agent_messages.append(agent_msg)
-                
-                # Keep only last MAX_MESSAGES
-                if len(agent_messages) > MAX_MESSAGES:
-                    agent_messages = agent_messages[-MAX_MESSAGES:]
+                record_agent_message("Etherius", success_msg)
                 
                 return ChatResponse(response=success_msg)
             else:
@@ -637,31 +933,31 @@ Your NFT has been transferred! The agent successfully used x402 to complete the
             return ChatResponse(response=f"❌ Error executing payment: {str(e)}")
     
     # Handle "verify" command for manual transaction verification
-    elif req.message.lower().startswith("verify "):
-        tx_hash = req.message[7:].strip()
-        
-        # Find most recent pending payment
-        recent_payment_id = None
-        for pid, purchase in active_purchases.items():
-            if purchase["status"] in ["awaiting_payment", "awaiting_funding"]:
-                recent_payment_id = pid
-                break
+    elif command == "verify" and separator:
+        tx_hash = argument
+        
+        # Find most recent pending payment: purchases are stored oldest first, so walk backwards
+        recent_payment_id, recent_purchase = next(
+            ((pid, purchase) for pid, purchase in reversed(active_purchases.items())
+             if purchase["status"] in PENDING_STATUSES),
+            (None, None)
+        )
         
         if not recent_payment_id:
             return ChatResponse(response="No pending payment found. Use 'buy' command first.")
         
         if tx_hash.startswith("0x") and len(tx_hash) == 66:
             # Mark as completed (simplified verification for demo)
-            active_purchases[recent_payment_id]["status"] = "completed"
-            active_purchases[recent_payment_id]["tx_hash"] = tx_hash
+            recent_purchase["status"] = "completed"
+            recent_purchase["tx_hash"] = tx_hash
             
             return ChatResponse(response=f"✅ Transaction verified! Payment {recent_payment_id} completed with tx: {tx_hash[:10]}...")
         else:
             return ChatResponse(response="❌ Invalid transaction hash. Must start with 0x and be 66 characters.")
     
     # Handle payment check requests (optional manual check)
-    elif req.message.lower().startswith("check "):
-        payment_id = req.message[6:].strip()
+    elif command == "check" and separator:
+        payment_id = argument
         
         if payment_id not in active_purchases:
             return ChatResponse(response=f"❌ Payment ID `{payment_id}` not found")
@@ -671,7 +967,7 @@ Your NFT has been transferred! The agent successfully used x402 to complete the
         if purchase["status"] == "completed":
             return ChatResponse(response=f"✅ Payment already confirmed! NFT: {purchase['nft']} has been transferred.")
         elif purchase["status"] == "awaiting_payment":
-            elapsed = int(time.time() - purchase["start_time"])
+            elapsed = int(time.monotonic() - purchase["start_time"])
             return ChatResponse(response=f"⏳ Still checking for payment... Auto-check running every 15 seconds. ({elapsed}s elapsed)")
         elif purchase["status"] == "expired":
             return ChatResponse(response=f"⏱️ Payment request expired. Please create a new purchase request.")
@@ -679,118 +975,68 @@ Your NFT has been transferred! The agent successfully used x402 to complete the
             return ChatResponse(response=f"Status: {purchase['status']}")
     
     # Handle "wallet" command to show agent wallet info
-    elif req.message.lower() == "wallet":
-        wallet_info = agent_wallet.get_wallet_info()
-        response = f"""
-💰 **Agent Wallet Information**
-
-**Address:** `{wallet_info['address']}`
-**Type:** {wallet_info['type']}
-**Network:** {wallet_info['network']}
-**Status:** {'Ready' if wallet_info['ready'] else 'Not Ready'}
-
-**Check Balance:** https://sepolia.basescan.org/address/{wallet_info['address']}
-
-To fund: Send USDC to the address above on Base Sepolia network.
-"""
-        return ChatResponse(response=response)
+    elif command == "wallet" and not separator:
+        return wallet_response
     
     # Check if this is a MeTTa query (starts with !)
     elif req.message.startswith("!"):
         ctx.logger.info("🧠 Detected MeTTa query, routing to MeTTa agent...")
         
-        if metta_agent_address:
-            # Remove the ! prefix and send to MeTTa agent
-            metta_request = MettaQueryRequest(query=req.message[1:])
-            await ctx.send(metta_agent_address, metta_request)
-            
-            # Store a placeholder message
-            agent_msg = AgentMessage(
-                agent_name="Etherius",
-                message="Processing MeTTa query...",
-                timestamp=time.time()
-            )
-            agent_messages.append(agent_msg)
-            
-            # Keep only last MAX_MESSAGES
-            if len(agent_messages) > MAX_MESSAGES:
-                agent_messages = agent_messages[-MAX_MESSAGES:]
-            
-            return ChatResponse(response="MeTTa query sent for processing. Results will appear shortly.")
-        else:
-            return ChatResponse(response="MeTTa agent not configured. Please ensure MeTTa agent is running.")
-    
-    # For non-MeTTa queries, broadcast to all agents as before
-    if katrik_agent_address and vitalik_agent_address and tv_agent_address:
-        broadcast_msg = BroadcastMessage(
-            message=req.message,
-            original_sender="user"
-        )
+        # Remove the ! prefix and send to MeTTa agent
+        metta_request = MettaQueryRequest(query=req.message[1:])
+        await ctx.send(METTA_ADDRESS, metta_request)
         
-        # Send to all agents (fire and forget)
-        ctx.logger.info("📢 Broadcasting message to all agents...")
-        await ctx.send(katrik_agent_address, broadcast_msg)
-        await ctx.send(vitalik_agent_address, broadcast_msg)
-        await ctx.send(tv_agent_address, broadcast_msg)
-        ctx.logger.info("✅ Broadcast complete")
-    else:
-        ctx.logger.warning("⚠️ Agent addresses not initialized, skipping broadcast")
+        # Store a placeholder message
+        record_agent_message("Etherius", "Processing MeTTa query...")
+        
+        return ChatResponse(response="MeTTa query sent for processing. Results will appear shortly.")
     
+    # For non-MeTTa queries, broadcast to all agents as before
     if not mcp_client:
+        await broadcast_to_agents(ctx, req.message)
         return ChatResponse(response="Agent not initialized. Please restart.")
     
-    response = await mcp_client.query_with_gpt(req.message, ctx)
-    
-    # Store Etherius's response
-    agent_msg = AgentMessage(
-        agent_name="Etherius",
-        message=response,
-        timestamp=time.time()
+    # Overlap the broadcast with the NFT query instead of waiting on it first
+    _, response = await asyncio.gather(
+        broadcast_to_agents(ctx, req.message),
+        mcp_client.query_with_gpt(req.message, ctx)
     )
-    agent_messages.append(agent_msg)
     
-    # Keep only last MAX_MESSAGES
-    if len(agent_messages) > MAX_MESSAGES:
-        agent_messages = agent_messages[-MAX_MESSAGES:]
+    # Store Etherius's response
+    record_agent_message("Etherius", response)
     
     return ChatResponse(response=response)
 
+async def broadcast_to_agents(ctx: Context, message: str):
+    """Broadcast a user message to the Katrik, Vitalik and TV agents"""
+    broadcast_msg = BroadcastMessage(
+        message=message,
+        original_sender="user"
+    )
+    
+    # Send to all agents at once (fire and forget)
+    ctx.logger.info("📢 Broadcasting message to all agents...")
+    await asyncio.gather(*(ctx.send(address, broadcast_msg) for address in BROADCAST_TARGETS))
+    ctx.logger.info("✅ Broadcast complete")
+
 @agent.on_message(model=BroadcastMessage)
 async def handle_agent_response(ctx: Context, sender: str, msg: BroadcastMessage):
     """Handle responses from other agents (like Vitalik's GPT response)"""
-    global agent_messages
     ctx.logger.info(f"📬 Received response from {sender}")
     ctx.logger.info(f"📝 Original sender: {msg.original_sender}")
     ctx.logger.info(f"💬 Response: {msg.message}")
     
     # Determine agent name from sender address
-    agent_name = "Unknown"
-    if sender == katrik_agent_address:
-        agent_name = "Katrik"
-    elif sender == vitalik_agent_address:
-        agent_name = "Vitalik"
-    elif sender == tv_agent_address:
-        agent_name = "TV"
-    elif sender == metta_agent_address:
-        agent_name = "MeTTa"
+    agent_name = AGENT_NAMES.get(sender, "Unknown")
     
     # Store the agent's response
-    agent_msg = AgentMessage(
-        agent_name=agent_name,
-        message=msg.message,
-        timestamp=time.time()
-    )
-    agent_messages.append(agent_msg)
-    
-    # Keep only last MAX_MESSAGES
-    if len(agent_messages) > MAX_MESSAGES:
-        agent_messages = agent_messages[-MAX_MESSAGES:]
+    record_agent_message(agent_name, msg.message)
 
 @agent.on_rest_get("/agent_messages", AgentMessagesResponse)
 async def get_agent_messages(ctx: Context) -> AgentMessagesResponse:
     """Get recent agent messages for frontend polling"""
-    global agent_messages
-    return AgentMessagesResponse(messages=agent_messages)
+    # Entries were built by record_agent_message, so skip re-validating the whole history
+    return AgentMessagesResponse.model_construct(messages=list(agent_messages))
 
 @agent.on_message(model=ImageUrlMessage)
 async def handle_tv_image(ctx: Context, sender: str, msg: ImageUrlMessage):
@@ -819,50 +1065,68 @@ async def health_check(ctx: Context) -> ChatResponse:
     ctx.logger.info("Health check requested")
     return ChatResponse(response="Simplified Etherius agent is healthy!")
 
-# Auto-check payment function
-async def auto_check_payment(ctx: Context, payment_id: str):
-    """Automatically check for payment every 15 seconds"""
-    global active_purchases, agent_messages
+# Auto-check pending payments
+@agent.on_interval(period=PAYMENT_CONFIG["auto_check_interval"])
+async def check_pending_payments(ctx: Context):
+    """Check every payment awaiting confirmation in one concurrent batch"""
+    now = time.monotonic()
+    
+    # Forget purchases past their retention; they are the oldest, so stop at the first newer one
+    forget_before = now - PURCHASE_RETENTION
+    while active_purchases:
+        oldest_id = next(iter(active_purchases))
+        if active_purchases[oldest_id]["start_time"] > forget_before:
+            break
+        del active_purchases[oldest_id]
     
-    if payment_id not in active_purchases:
+    # Anything started at or before this moment has used up its check window
+    expired_before = now - PAYMENT_CONFIG["max_check_time"]
+    pending = []
+    for payment_id, purchase in active_purchases.items():
+        if purchase["status"] != "awaiting_payment":
+            continue
+        if purchase["start_time"] <= expired_before:
+            # Timeout reached
+            purchase["status"] = "expired"
+            ctx.logger.info(f"⏱️ Payment {payment_id} expired after 5 minutes")
+            
+            timeout_message = f"""
+⏱️ **Payment Window Expired**
+
+Payment ID `{payment_id}` has expired after 5 minutes.
+If you already sent payment, please contact support.
+To try again, send a new "buy" request.
+"""
+            
+            record_agent_message("Etherius", timeout_message)
+        else:
+            pending.append((payment_id, purchase))
+    
+    if not pending:
         return
     
-    purchase = active_purchases[payment_id]
-    end_time = purchase["start_time"] + PAYMENT_CONFIG["max_check_time"]
-    check_count = 0
+    ctx.logger.info(f"🔍 Auto-checking {len(pending)} pending payment(s)")
     
-    ctx.logger.info(f"🔄 Starting auto-check for payment {payment_id}")
+    # Check blockchain for all pending payments at once
+    receiving_address = PAYMENT_CONFIG["receiving_address"]
+    results = await asyncio.gather(*(
+        check_blockchain(receiving_address, purchase["price"], payment_id)
+        for payment_id, purchase in pending
+    ))
     
-    while time.time() < end_time:
-        check_count += 1
-        
-        # Wait before checking
-        await asyncio.sleep(PAYMENT_CONFIG["auto_check_interval"])
-        
-        # Check if purchase still active
-        if payment_id not in active_purchases:
-            break
-        if purchase["status"] != "awaiting_payment":
-            break
+    for (payment_id, purchase), payment_found in zip(pending, results):
+        # Skip payments settled elsewhere (execute/verify) while we were checking
+        if not payment_found or purchase["status"] != "awaiting_payment":
+            continue
         
-        ctx.logger.info(f"🔍 Auto-check #{check_count} for {payment_id}")
+        # Payment detected!
+        ctx.logger.info(f"✅ Payment detected for {payment_id}!")
         
-        # Check blockchain (mock for now)
-        payment_found = await check_blockchain(
-            PAYMENT_CONFIG["receiving_address"],
-            purchase["price"],
-            payment_id
-        )
+        purchase["status"] = "completed"
+        purchase["tx_hash"] = payment_found  # tx hash from blockchain
         
-        if payment_found:
-            # Payment detected!
-            ctx.logger.info(f"✅ Payment detected for {payment_id}!")
-            
-            purchase["status"] = "completed"
-            purchase["tx_hash"] = payment_found  # tx hash from blockchain
-            
-            # Notify user immediately
-            success_message = f"""
+        # Notify user immediately
+        success_message = f"""
 🎉 **Payment Automatically Detected!**
 
 **Payment ID:** `{payment_id}`
@@ -873,45 +1137,30 @@ async def auto_check_payment(ctx: Context, payment_id: str):
 
 Thank you for your purchase!
 """
-            
-            # Add to messages for user to see
-            agent_messages.append(AgentMessage(
-                agent_name="Etherius",
-                message=success_message,
-                timestamp=time.time()
-            ))
-            
-            # Keep only last MAX_MESSAGES
-            if len(agent_messages) > MAX_MESSAGES:
-                agent_messages = agent_messages[-MAX_MESSAGES:]
-            
-            # Transfer NFT (mock)
-            await transfer_nft(purchase["nft"])
-            
-            break
-    
-    # Timeout reached
-    if purchase["status"] == "awaiting_payment":
-        purchase["status"] = "expired"
-        ctx.logger.info(f"⏱️ Payment {payment_id} expired after 5 minutes")
         
-        timeout_message = f"""
-⏱️ **Payment Window Expired**
-
-Payment ID `{payment_id}` has expired after 5 minutes.
-If you already sent payment, please contact support.
-To try again, send a new "buy" request.
-"""
+        # Add to messages for user to see
+        record_agent_message("Etherius", success_message)
         
-        agent_messages.append(AgentMessage(
-            agent_name="Etherius",
-            message=timeout_message,
-            timestamp=time.time()
-        ))
+        # Transfer NFT (mock)
+        await transfer_nft(purchase["nft"])
+
+# x402 payment request creation
+async def create_x402_payment(ctx: Context, nft_name: str) -> Optional[str]:
+    """Create a payment request via x402 service, returning its payment ID"""
+    try:
+        payment_response = await get_http_client().post(
+            X402_CREATE_URL,
+            params={"nft_name": nft_name, "price": PAYMENT_CONFIG["default_price"]},
+            timeout=X402_TIMEOUT
+        )
         
-        # Keep only last MAX_MESSAGES
-        if len(agent_messages) > MAX_MESSAGES:
-            agent_messages = agent_messages[-MAX_MESSAGES:]
+        if payment_response.status_code == 200:
+            payment_id = orjson.loads(payment_response.content)["payment_id"]
+            ctx.logger.info(f"Created x402 payment request: {payment_id}")
+            return payment_id
+    except Exception as e:
+        ctx.logger.error(f"Failed to create x402 payment request: {e}")
+    return None
 
 # Real x402 payment verification
 async def check_blockchain(address: str, amount: float, payment_id: str) -> Optional[str]:
@@ -921,43 +1170,45 @@ async def check_blockchain(address: str, amount: float, payment_id: str) -> Opti
     """
     try:
         # Check payment status via x402 service
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # First check if payment has been recorded
-            status_response = await client.get(
-                f"http://localhost:8402/payment/status/{payment_id}"
-            )
-            
-            if status_response.status_code == 200:
-                status_data = status_response.json()
-                if status_data.get("status") == "completed":
-                    # Payment already verified
-                    return status_data.get("tx_hash", f"0x{payment_id}")
-            
-            # Try to verify payment through x402 protected endpoint
-            # This will return 402 if payment not made, 200 if payment verified
-            verify_response = await client.post(
-                f"http://localhost:8402/nft/purchase/{payment_id}",
-                headers={
-                    "X-Payment-Id": payment_id,
-                    "Content-Type": "application/json"
-                },
-                json={"payment_id": payment_id}
-            )
+        client = get_http_client()
+        # First check if payment has been recorded
+        status_response = await client.get(
+            X402_STATUS_URL(payment_id),
+            timeout=X402_TIMEOUT
+        )
+        
+        if status_response.status_code == 200:
+            status_data = orjson.loads(status_response.content)
+            if status_data.get("status") == "completed":
+                # Payment already verified
+                return status_data.get("tx_hash", f"0x{payment_id}")
+        
+        # Try to verify payment through x402 protected endpoint
+        # This will return 402 if payment not made, 200 if payment verified
+        verify_response = await client.post(
+            X402_PURCHASE_URL(payment_id),
+            headers={
+                "X-Payment-Id": payment_id,
+                "Content-Type": "application/json"
+            },
+            json={"payment_id": payment_id},
+            timeout=X402_TIMEOUT
+        )
+        
+        if verify_response.status_code == 200:
+            # Payment successfully verified by x402
+            data = orjson.loads(verify_response.content)
+            return data.get("tx_hash", f"0x{payment_id}")
+        elif verify_response.status_code == 402:
+            # Payment still required - user hasn't paid yet
+            return None
+        else:
+            # Some other error
+            return None
             
-            if verify_response.status_code == 200:
-                # Payment successfully verified by x402
-                data = verify_response.json()
-                return data.get("tx_hash", f"0x{payment_id}")
-            elif verify_response.status_code == 402:
-                # Payment still required - user hasn't paid yet
-                return None
-            else:
-                # Some other error
-                return None
-                
     except Exception as e:
         # Log error but don't crash
-        print(f"Error checking payment {payment_id}: {e}")
+        logger.warning("Error checking payment %s: %s", payment_id, e)
         return None
 
 # Mock NFT transfer
@@ -966,6 +1217,11 @@ async def transfer_nft(nft_name: str) -> bool:
     # In production: Execute actual NFT contract transfer
     return True
 
+@agent.on_event("shutdown")
+async def shutdown(ctx: Context):
+    ctx.logger.info("Etherius Agent shutting down")
+    await close_http_client()
+
 if __name__ == "__main__":
     print("""
 🌟 Simplified Etherius Agent - ASI:One Mini Powered NFT Intelligence
@@ -976,4 +1232,11 @@ if __name__ == "__main__":
 • REST API: POST /chat {"message": "your question"}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     """)
+    # Run on a uvloop loop when it's installed; only the script does this, so importers
+    # (e.g. the chat agent via nft_service) keep their own loop
+    try:
+        import uvloop
+        agent.update_loop(uvloop.new_event_loop())
+    except ImportError:
+        pass
     agent.run()
\ No newline at end of file
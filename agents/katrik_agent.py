@@ -1,17 +1,21 @@
 import os
 import sys
-import requests
 import asyncio
 from dotenv import load_dotenv
 from uagents import Agent, Context, Model
+from openai_chat import OPENAI_API_KEY, OPENAI_MODEL, chat_completion, close_openai_session
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
-# OpenAI API configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# OpenAI completion length for this agent
+OPENAI_MAX_TOKENS = int(os.getenv("KATRIK_MAX_TOKENS", "80"))  # replies are capped at ~20 words
+
+KATRIK_SYSTEM_MESSAGE = {"role": "system", "content": """You are Katrik, an NFT enthusiast having a casual discussion with Vitalik.
+                     Respond to his question naturally (max 20 words).
+                     Be conversational, like chatting with a friend about NFTs."""}
+KATRIK_USER_TEMPLATE = "Context: User wants {original_message}\n\nVitalik asks: {question}"
 
 # Etherius agent address (to broadcast messages)
 ETHERIUS_ADDRESS = "agent1q0vk6hezvvd89rwy0hdzaw2kertckqa40rae4a03jpsgvkye0dw8qyw3n7m"
@@ -49,44 +53,39 @@ async def handle_idea_question(ctx: Context, sender: str, msg: IdeaQuestion):
         try:
             ctx.logger.info("Phase 2: Analyzing as NFT market analyst...")
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            
             data = {
-                "model": "gpt-4o-mini",
+                "model": OPENAI_MODEL,
+                "max_completion_tokens": OPENAI_MAX_TOKENS,
                 "messages": [
-                    {"role": "system", "content": """You are Katrik, an NFT enthusiast having a casual discussion with Vitalik.
-                     Respond to his question naturally (max 20 words).
-                     Be conversational, like chatting with a friend about NFTs."""},
-                    {"role": "user", "content": f"Context: User wants {msg.original_message}\n\nVitalik asks: {msg.question}"}
+                    KATRIK_SYSTEM_MESSAGE,
+                    {"role": "user", "content": KATRIK_USER_TEMPLATE.format(
+                        original_message=msg.original_message, question=msg.question
+                    )}
                 ]
             }
             
-            response = requests.post(OPENAI_API_URL, headers=headers, json=data)
+            api_status, analysis = await chat_completion(data)
             
-            if response.status_code == 200:
-                analysis = response.json()['choices'][0]['message']['content']
+            if api_status == 200:
                 ctx.logger.info(f"Market analysis: {analysis}")
                 
                 # Small delay before responding (thinking time)
                 await asyncio.sleep(2)
                 
-                # Broadcast analysis to Etherius for display
+                # Reply to Vitalik and broadcast analysis to Etherius for display
+                # in a single round instead of two back-to-back sends
                 broadcast_msg = BroadcastMessage(
                     message=analysis,
                     original_sender="katrik"
                 )
-                await ctx.send(ETHERIUS_ADDRESS, broadcast_msg)
-                ctx.logger.info("Analysis broadcast to Etherius")
-                
-                # Send response back to Vitalik
                 response_msg = IdeaResponse(response=analysis)
-                await ctx.send(sender, response_msg)
-                ctx.logger.info("Response sent back to Vitalik")
+                await asyncio.gather(
+                    ctx.send(sender, response_msg),
+                    ctx.send(ETHERIUS_ADDRESS, broadcast_msg)
+                )
+                ctx.logger.info("Response sent back to Vitalik and broadcast to Etherius")
             else:
-                ctx.logger.error(f"ChatGPT API error: {response.status_code} - {response.text}")
+                ctx.logger.error(f"ChatGPT API error: {api_status} - {analysis}")
                 # Send error response
                 error_msg = IdeaResponse(response="Unable to analyze at this time.")
                 await ctx.send(sender, error_msg)
@@ -104,6 +103,7 @@ async def handle_idea_question(ctx: Context, sender: str, msg: IdeaQuestion):
 @agent.on_event("shutdown")
 async def shutdown(ctx: Context):
     ctx.logger.info("Katrik Agent shutting down")
+    await close_openai_session()
 
 if __name__ == "__main__":
     print("""
@@ -1,8 +1,11 @@
 import os
+import re
 import sys
+from collections import defaultdict
+from functools import lru_cache
 from dotenv import load_dotenv
 from uagents import Agent, Context, Model
-from hyperon import MeTTa, E, S, ValueAtom
+from hyperon import MeTTa
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -27,117 +30,210 @@ class BroadcastMessage(Model):
 # Initialize MeTTa instance
 metta = MeTTa()
 
-def initialize_nft_knowledge():
-    """Initialize the NFT/Ethereum knowledge graph"""
-    
+# NFT/Ethereum knowledge graph as (predicate, subject, object) facts.
+# Tokens are written in MeTTa syntax: quoted objects are string literals.
+NFT_FACTS = (
     # NFT Collections → Chains
-    metta.space().add_atom(E(S("collection"), S("pudgy-penguins"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("bored-apes"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("azuki"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("doodles"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("cryptopunks"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("moonbirds"), S("ethereum")))
-    metta.space().add_atom(E(S("collection"), S("degods"), S("solana")))
-    metta.space().add_atom(E(S("collection"), S("okay-bears"), S("solana")))
-    metta.space().add_atom(E(S("collection"), S("base-punks"), S("base")))
-    metta.space().add_atom(E(S("collection"), S("polygon-apes"), S("polygon")))
-    
+    ("collection", "pudgy-penguins", "ethereum"),
+    ("collection", "bored-apes", "ethereum"),
+    ("collection", "azuki", "ethereum"),
+    ("collection", "doodles", "ethereum"),
+    ("collection", "cryptopunks", "ethereum"),
+    ("collection", "moonbirds", "ethereum"),
+    ("collection", "degods", "solana"),
+    ("collection", "okay-bears", "solana"),
+    ("collection", "base-punks", "base"),
+    ("collection", "polygon-apes", "polygon"),
+
     # Collections → Floor Prices (example values)
-    metta.space().add_atom(E(S("floor_price"), S("pudgy-penguins"), ValueAtom("12.5 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("bored-apes"), ValueAtom("25.0 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("azuki"), ValueAtom("8.5 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("doodles"), ValueAtom("3.2 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("cryptopunks"), ValueAtom("45.0 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("moonbirds"), ValueAtom("2.8 ETH")))
-    metta.space().add_atom(E(S("floor_price"), S("degods"), ValueAtom("5.5 SOL")))
-    metta.space().add_atom(E(S("floor_price"), S("okay-bears"), ValueAtom("3.2 SOL")))
-    
+    ("floor_price", "pudgy-penguins", '"12.5 ETH"'),
+    ("floor_price", "bored-apes", '"25.0 ETH"'),
+    ("floor_price", "azuki", '"8.5 ETH"'),
+    ("floor_price", "doodles", '"3.2 ETH"'),
+    ("floor_price", "cryptopunks", '"45.0 ETH"'),
+    ("floor_price", "moonbirds", '"2.8 ETH"'),
+    ("floor_price", "degods", '"5.5 SOL"'),
+    ("floor_price", "okay-bears", '"3.2 SOL"'),
+
     # Collections → Categories
-    metta.space().add_atom(E(S("category"), S("pudgy-penguins"), S("pfp")))
-    metta.space().add_atom(E(S("category"), S("bored-apes"), S("pfp")))
-    metta.space().add_atom(E(S("category"), S("azuki"), S("anime")))
-    metta.space().add_atom(E(S("category"), S("art-blocks"), S("generative-art")))
-    metta.space().add_atom(E(S("category"), S("cryptopunks"), S("og-pfp")))
-    metta.space().add_atom(E(S("category"), S("moonbirds"), S("pfp")))
-    
+    ("category", "pudgy-penguins", "pfp"),
+    ("category", "bored-apes", "pfp"),
+    ("category", "azuki", "anime"),
+    ("category", "art-blocks", "generative-art"),
+    ("category", "cryptopunks", "og-pfp"),
+    ("category", "moonbirds", "pfp"),
+
     # Collections → Trending Status
-    metta.space().add_atom(E(S("trending"), S("pudgy-penguins"), S("up")))
-    metta.space().add_atom(E(S("trending"), S("bored-apes"), S("stable")))
-    metta.space().add_atom(E(S("trending"), S("azuki"), S("down")))
-    metta.space().add_atom(E(S("trending"), S("base-punks"), S("up")))
-    
+    ("trending", "pudgy-penguins", "up"),
+    ("trending", "bored-apes", "stable"),
+    ("trending", "azuki", "down"),
+    ("trending", "base-punks", "up"),
+
     # Similar Collections
-    metta.space().add_atom(E(S("similar_to"), S("pudgy-penguins"), S("doodles")))
-    metta.space().add_atom(E(S("similar_to"), S("bored-apes"), S("mutant-apes")))
-    metta.space().add_atom(E(S("similar_to"), S("cryptopunks"), S("base-punks")))
-    metta.space().add_atom(E(S("similar_to"), S("azuki"), S("moonbirds")))
-    
+    ("similar_to", "pudgy-penguins", "doodles"),
+    ("similar_to", "bored-apes", "mutant-apes"),
+    ("similar_to", "cryptopunks", "base-punks"),
+    ("similar_to", "azuki", "moonbirds"),
+
     # DeFi Protocols → Types
-    metta.space().add_atom(E(S("defi"), S("uniswap"), S("dex")))
-    metta.space().add_atom(E(S("defi"), S("sushiswap"), S("dex")))
-    metta.space().add_atom(E(S("defi"), S("aave"), S("lending")))
-    metta.space().add_atom(E(S("defi"), S("compound"), S("lending")))
-    metta.space().add_atom(E(S("defi"), S("opensea"), S("marketplace")))
-    metta.space().add_atom(E(S("defi"), S("blur"), S("marketplace")))
-    metta.space().add_atom(E(S("defi"), S("looksrare"), S("marketplace")))
-    metta.space().add_atom(E(S("defi"), S("maker"), S("stablecoin")))
-    metta.space().add_atom(E(S("defi"), S("curve"), S("dex")))
-    
+    ("defi", "uniswap", "dex"),
+    ("defi", "sushiswap", "dex"),
+    ("defi", "aave", "lending"),
+    ("defi", "compound", "lending"),
+    ("defi", "opensea", "marketplace"),
+    ("defi", "blur", "marketplace"),
+    ("defi", "looksrare", "marketplace"),
+    ("defi", "maker", "stablecoin"),
+    ("defi", "curve", "dex"),
+
     # DeFi → Chains
-    metta.space().add_atom(E(S("defi_chain"), S("uniswap"), S("ethereum")))
-    metta.space().add_atom(E(S("defi_chain"), S("aave"), S("multi-chain")))
-    metta.space().add_atom(E(S("defi_chain"), S("opensea"), S("multi-chain")))
-    metta.space().add_atom(E(S("defi_chain"), S("blur"), S("ethereum")))
-    
+    ("defi_chain", "uniswap", "ethereum"),
+    ("defi_chain", "aave", "multi-chain"),
+    ("defi_chain", "opensea", "multi-chain"),
+    ("defi_chain", "blur", "ethereum"),
+
     # Gas Patterns
-    metta.space().add_atom(E(S("gas_pattern"), S("weekend"), ValueAtom("lower")))
-    metta.space().add_atom(E(S("gas_pattern"), S("weekday_morning"), ValueAtom("higher")))
-    metta.space().add_atom(E(S("gas_pattern"), S("nft_mint"), ValueAtom("spike")))
-    metta.space().add_atom(E(S("gas_pattern"), S("late_night"), ValueAtom("lowest")))
-    metta.space().add_atom(E(S("gas_pattern"), S("defi_farming"), ValueAtom("elevated")))
-    
+    ("gas_pattern", "weekend", '"lower"'),
+    ("gas_pattern", "weekday_morning", '"higher"'),
+    ("gas_pattern", "nft_mint", '"spike"'),
+    ("gas_pattern", "late_night", '"lowest"'),
+    ("gas_pattern", "defi_farming", '"elevated"'),
+
     # Wallet Types
-    metta.space().add_atom(E(S("wallet_type"), S("whale"), ValueAtom(">1000 ETH")))
-    metta.space().add_atom(E(S("wallet_type"), S("dolphin"), ValueAtom("100-1000 ETH")))
-    metta.space().add_atom(E(S("wallet_type"), S("fish"), ValueAtom("10-100 ETH")))
-    metta.space().add_atom(E(S("wallet_type"), S("shrimp"), ValueAtom("<10 ETH")))
-    
+    ("wallet_type", "whale", '">1000 ETH"'),
+    ("wallet_type", "dolphin", '"100-1000 ETH"'),
+    ("wallet_type", "fish", '"10-100 ETH"'),
+    ("wallet_type", "shrimp", '"<10 ETH"'),
+
     # NFT Traits → Rarity
-    metta.space().add_atom(E(S("trait_rarity"), S("golden-background"), ValueAtom("0.5%")))
-    metta.space().add_atom(E(S("trait_rarity"), S("laser-eyes"), ValueAtom("2%")))
-    metta.space().add_atom(E(S("trait_rarity"), S("diamond-hands"), ValueAtom("1%")))
-    metta.space().add_atom(E(S("trait_rarity"), S("zombie-skin"), ValueAtom("0.3%")))
-    
+    ("trait_rarity", "golden-background", '"0.5%"'),
+    ("trait_rarity", "laser-eyes", '"2%"'),
+    ("trait_rarity", "diamond-hands", '"1%"'),
+    ("trait_rarity", "zombie-skin", '"0.3%"'),
+
     # Market Signals
-    metta.space().add_atom(E(S("market_signal"), S("high_volume"), S("bullish")))
-    metta.space().add_atom(E(S("market_signal"), S("whale_accumulation"), S("bullish")))
-    metta.space().add_atom(E(S("market_signal"), S("listing_spike"), S("bearish")))
-    metta.space().add_atom(E(S("market_signal"), S("holder_decrease"), S("bearish")))
+    ("market_signal", "high_volume", "bullish"),
+    ("market_signal", "whale_accumulation", "bullish"),
+    ("market_signal", "listing_spike", "bearish"),
+    ("market_signal", "holder_decrease", "bearish"),
+)
+
+# Facts bucketed by their first symbol, mirroring the space for indexed lookups
+FACT_INDEX = defaultdict(list)
+for predicate, subject, obj in NFT_FACTS:
+    FACT_INDEX[predicate].append((subject, obj))
+
+# Single-pattern queries the index can answer: !(match &self (<head> <arg> <arg>) $var)
+SIMPLE_MATCH_RE = re.compile(r'^!\(match &self \(([^\s()]+) ([^\s()]+) ([^\s()]+)\) (\$[^\s()]+)\)$')
+
+# The only cacheable shape: one !(match &self <pattern> $var) expression. The pattern is only
+# matched, never evaluated, and a bare variable template can't call anything
+READ_ONLY_MATCH_RE = re.compile(r'^!\(match &self (\(.+\)) \$[^\s()"]+\)$')
+
+# The whole fact table as one MeTTa program; bare expressions are added to &self
+NFT_KNOWLEDGE_PROGRAM = "\n".join(f"({predicate} {subject} {obj})" for predicate, subject, obj in NFT_FACTS)
+
+# Matches every fact once; run directly so it never lands in the query cache
+WARMUP_QUERY = "!(match &self ($predicate $subject $object) 1)"
+
+def initialize_nft_knowledge():
+    """Initialize the NFT/Ethereum knowledge graph"""
+    metta.run(NFT_KNOWLEDGE_PROGRAM)
 
 def format_results(results):
     """Format MeTTa query results into readable text"""
-    if not results or results == [[]]:
+    if not results:
         return "No results found for this query."
     
-    # Flatten results if nested
-    flat_results = []
-    for item in results:
-        if isinstance(item, list):
-            for subitem in item:
-                flat_results.append(str(subitem))
-        else:
-            flat_results.append(str(item))
+    if len(results) == 1 and isinstance(results[0], list):
+        # Common case: a single result set needs no flattening
+        if not results[0]:
+            return "No results found for this query."
+        flat_results = list(map(str, results[0]))
+    else:
+        # Flatten results if nested
+        flat_results = []
+        for item in results:
+            if isinstance(item, list):
+                flat_results.extend(map(str, item))
+            else:
+                flat_results.append(str(item))
     
     if len(flat_results) == 1:
         return f"Result: {flat_results[0]}"
     else:
         return "Results:\n" + "\n".join(f"• {r}" for r in flat_results)
 
+def normalize_query(query):
+    """Collapse whitespace and add the ! prefix back if it was removed"""
+    query = " ".join(query.split())
+    if not query.startswith("!"):
+        query = "!" + query
+    return query
+
+def match_indexed(query):
+    """Answer a simple match query from FACT_INDEX, or return None to defer to MeTTa"""
+    match = SIMPLE_MATCH_RE.match(query)
+    if not match or match.group(1) not in FACT_INDEX:
+        return None
+    
+    head, subject_pattern, object_pattern, template = match.groups()
+    if template not in (subject_pattern, object_pattern):
+        return None
+    
+    results = []
+    for subject, obj in FACT_INDEX[head]:
+        bindings = {}
+        for pattern, value in ((subject_pattern, subject), (object_pattern, obj)):
+            if pattern.startswith("$"):
+                if bindings.setdefault(pattern, value) != value:
+                    break
+            elif pattern != value:
+                break
+        else:
+            results.append(bindings[template])
+    return [results]
+
+def is_read_only_match(query):
+    """True if the query is a single read-only match expression, safe to cache"""
+    if "!" in query[1:] or not READ_ONLY_MATCH_RE.match(query):
+        return False
+    # The outer parenthesis must close at the very end, so this is one top-level expression
+    depth = 0
+    for position, char in enumerate(query[1:], 1):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0 and position != len(query) - 1:
+                return False
+    return depth == 0
+
+@lru_cache(maxsize=1024)
+def run_cached_query(query):
+    """Run a read-only MeTTa query; execute_query clears this cache before anything else runs"""
+    results = match_indexed(query)
+    if results is None:
+        results = metta.run(query)
+    return format_results(results)
+
+def execute_query(query):
+    """Execute a normalized MeTTa query, serving repeated read-only queries from cache"""
+    if is_read_only_match(query):
+        return run_cached_query(query)
+    # Anything else may change the space (add-atom, add-reduct, state updates, imports...),
+    # so every cached result and the index may be stale afterwards
+    run_cached_query.cache_clear()
+    FACT_INDEX.clear()
+    return format_results(metta.run(query))
+
 @agent.on_event("startup")
 async def startup(ctx: Context):
     ctx.logger.info(f"MeTTa Agent starting with address: {agent.address}")
     ctx.logger.info("Initializing NFT/Ethereum knowledge graph...")
     initialize_nft_knowledge()
+    # Run one throwaway match so the interpreter is warm before the first real query
+    metta.run(WARMUP_QUERY)
     ctx.logger.info("Knowledge graph initialized successfully")
     ctx.logger.info("Ready to process MeTTa queries")
 
@@ -146,20 +242,13 @@ async def handle_metta_query(ctx: Context, sender: str, msg: MettaQueryRequest):
     ctx.logger.info(f"Received MeTTa query from {sender}: {msg.query}")
     
     try:
-        # Add the ! prefix back if it was removed
-        query = msg.query
-        if not query.startswith("!"):
-            query = "!" + query
-            
+        query = normalize_query(msg.query)
         ctx.logger.info(f"Executing query: {query}")
         
-        # Execute the MeTTa query
-        results = metta.run(query)
-        
-        ctx.logger.info(f"Query results: {results}")
+        # Execute the MeTTa query and format the results
+        formatted_results = execute_query(query)
         
-        # Format the results
-        formatted_results = format_results(results)
+        ctx.logger.info(f"Query results: {formatted_results}")
         
         # Send results back to the sender
         response = BroadcastMessage(
@@ -1,35 +1,58 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Optional
+
 from uagents import Model
 
+if TYPE_CHECKING:
+    from etherius_agent import SimpleOpenSeaMCP
+
 class NFTQueryRequest(Model):
     query: str  # Natural language NFT query
 
 class NFTQueryResponse(Model):
     results: str
 
+logger = logging.getLogger(__name__)
+
+# Create a minimal context for the MCP client; its logs go through the module logger
+class MinimalContext:
+    logger = logger
+
+# Shared MCP client, created on first use and reused for every query
+_mcp_client: Optional["SimpleOpenSeaMCP"] = None
+_mcp_client_lock = asyncio.Lock()
+
+async def get_mcp_client() -> "SimpleOpenSeaMCP":
+    """Return the shared MCP client, creating it once under concurrent first calls"""
+    global _mcp_client
+    if _mcp_client is None:
+        async with _mcp_client_lock:
+            if _mcp_client is None:
+                # Imported on first use: etherius_agent builds its own Agent at import time
+                from etherius_agent import SimpleOpenSeaMCP
+                _mcp_client = SimpleOpenSeaMCP(MinimalContext())
+    return _mcp_client
+
+async def close_mcp_client():
+    """Close the shared MCP client's connection pool on agent shutdown"""
+    global _mcp_client
+    if _mcp_client is None:
+        return
+    from etherius_agent import close_http_client
+    await close_http_client()
+    _mcp_client = None
+
 async def get_nft_info(query: str) -> str:
     """
     Process NFT query using the SimpleOpenSeaMCP client
     """
     try:
-        # Import the existing MCP client functionality
-        from etherius_agent import SimpleOpenSeaMCP
-        from uagents import Context
-        
-        # Create a minimal context for the MCP client
-        class MinimalContext:
-            class Logger:
-                def info(self, msg): pass
-                def error(self, msg): print(f"ERROR: {msg}")
-                def warning(self, msg): print(f"WARNING: {msg}")
-            logger = Logger()
-        
-        # Initialize MCP client
-        ctx = MinimalContext()
-        mcp_client = SimpleOpenSeaMCP(ctx)
-        
+        mcp_client = await get_mcp_client()
+
         # Use the existing query_with_gpt method
         result = await mcp_client.query_with_gpt(query)
         return result
-        
+
     except Exception as e:
-        return f"Error fetching NFT information: {str(e)}"
\ No newline at end of file
+        return f"Error fetching NFT information: {str(e)}"
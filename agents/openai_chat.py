@@ -0,0 +1,67 @@
+"""
+OpenAI Chat Completions client shared by the Vitalik, Katrik and TV agents
+Non-blocking aiohttp calls over one keep-alive session per process
+"""
+
+import os
+import asyncio
+import aiohttp
+import orjson
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# OpenAI API configuration
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+OPENAI_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {OPENAI_API_KEY}"
+}
+OPENAI_TIMEOUT = aiohttp.ClientTimeout(total=60)
+OPENAI_MAX_RETRIES = 3  # attempts per completion when rate limited (429)
+
+# Cap on completions in flight, so bursts of broadcasts queue here instead of tripping rate limits
+openai_slots = asyncio.Semaphore(int(os.getenv("OPENAI_CONCURRENCY", "8")))
+
+def orjson_serialize(obj) -> str:
+    """Encode request bodies with orjson; aiohttp expects a str"""
+    return orjson.dumps(obj).decode()
+
+# Keep-alive session shared by every OpenAI call, created inside the running loop
+openai_session: Optional[aiohttp.ClientSession] = None
+
+def get_openai_session() -> aiohttp.ClientSession:
+    """Return the shared OpenAI session, creating it on first use"""
+    global openai_session
+    if openai_session is None or openai_session.closed:
+        openai_session = aiohttp.ClientSession(
+            headers=OPENAI_HEADERS, timeout=OPENAI_TIMEOUT, json_serialize=orjson_serialize
+        )
+    return openai_session
+
+async def chat_completion(data: dict) -> Tuple[int, str]:
+    """
+    POST a chat completion without blocking the event loop
+
+    Returns:
+        (HTTP status, message content on 200 or the error response body otherwise)
+    """
+    for attempt in range(OPENAI_MAX_RETRIES):
+        async with openai_slots:
+            async with get_openai_session().post(OPENAI_API_URL, json=data) as response:
+                if response.status != 429 or attempt == OPENAI_MAX_RETRIES - 1:
+                    if response.status != 200:
+                        return response.status, await response.text()
+                    body = await response.json(loads=orjson.loads)
+                    return response.status, body['choices'][0]['message']['content']
+        # Rate limited: back off without holding a slot
+        await asyncio.sleep(2 ** attempt)
+
+async def close_openai_session():
+    """Close the shared session on agent shutdown"""
+    if openai_session and not openai_session.closed:
+        await openai_session.close()
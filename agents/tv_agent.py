@@ -1,17 +1,24 @@
 import os
 import sys
-import requests
 import re
+import hashlib
+from collections import OrderedDict
 from dotenv import load_dotenv
 from uagents import Agent, Context, Model
+from openai_chat import OPENAI_API_KEY, OPENAI_MODEL, chat_completion, close_openai_session
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
-# OpenAI API configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# OpenAI completion length for this agent
+OPENAI_MAX_TOKENS = int(os.getenv("TV_MAX_TOKENS", "200"))  # the reply is a single URL
+
+# Extracted URLs keyed by a digest of the broadcast text, least recently used evicted first
+URL_CACHE_SIZE = 1024
+url_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+URL_EXTRACTION_SYSTEM_MESSAGE = {"role": "system", "content": "Extract exactly ONE NFT image URL from the text"}
 
 # Etherius agent address (to send image URLs back)
 ETHERIUS_ADDRESS = "agent1q0vk6hezvvd89rwy0hdzaw2kertckqa40rae4a03jpsgvkye0dw8qyw3n7m"
@@ -52,25 +59,33 @@ async def handle_broadcast(ctx: Context, sender: str, msg: BroadcastMessage):
     # Extract NFT image URL using GPT
     if OPENAI_API_KEY:
         try:
-            ctx.logger.info("Extracting NFT image URL with GPT...")
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            
-            data = {
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {"role": "system", "content": """Extract exactly ONE NFT image URL from the text"""},
-                    {"role": "user", "content": msg.message}
-                ]
-            }
-            
-            response = requests.post(OPENAI_API_URL, headers=headers, json=data)
+            # A repeated broadcast (e.g. a cached Etherius answer) gets the URL extracted last time
+            message_key = hashlib.blake2b(msg.message.encode(), digest_size=16).digest()
+            content = url_cache.get(message_key)
+            if content is not None:
+                url_cache.move_to_end(message_key)
+                api_status = 200
+                ctx.logger.info("Reusing image URL extracted from an identical message")
+            else:
+                ctx.logger.info("Extracting NFT image URL with GPT...")
+                
+                data = {
+                    "model": OPENAI_MODEL,
+                    "max_completion_tokens": OPENAI_MAX_TOKENS,
+                    "messages": [
+                        URL_EXTRACTION_SYSTEM_MESSAGE,
+                        {"role": "user", "content": msg.message}
+                    ]
+                }
+                
+                api_status, content = await chat_completion(data)
+                if api_status == 200:
+                    url_cache[message_key] = content
+                    if len(url_cache) > URL_CACHE_SIZE:
+                        url_cache.popitem(last=False)
             
-            if response.status_code == 200:
-                image_url = response.json()['choices'][0]['message']['content'].strip()
+            if api_status == 200:
+                image_url = content.strip()
                 
                 # Validate it looks like a URL
                 if image_url and (image_url.startswith('http') or image_url.startswith('ipfs://')):
@@ -87,7 +102,7 @@ async def handle_broadcast(ctx: Context, sender: str, msg: BroadcastMessage):
                 else:
                     ctx.logger.info(f"No valid image URL found in message:{image_url}")
             else:
-                ctx.logger.error(f"GPT API error: {response.status_code} - {response.text}")
+                ctx.logger.error(f"GPT API error: {api_status} - {content}")
         except Exception as e:
             ctx.logger.error(f"Error extracting image URL: {e}")
     else:
@@ -96,6 +111,7 @@ async def handle_broadcast(ctx: Context, sender: str, msg: BroadcastMessage):
 @agent.on_event("shutdown")
 async def shutdown(ctx: Context):
     ctx.logger.info("TV Agent shutting down")
+    await close_openai_session()
 
 if __name__ == "__main__":
     print("""
@@ -1,17 +1,31 @@
 import os
 import sys
-import requests
 import asyncio
+from typing import Set
 from dotenv import load_dotenv
 from uagents import Agent, Context, Model
+from openai_chat import OPENAI_API_KEY, OPENAI_MODEL, chat_completion, close_openai_session
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
-# OpenAI API configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# OpenAI completion length for this agent
+OPENAI_MAX_TOKENS = int(os.getenv("VITALIK_MAX_TOKENS", "80"))  # replies are capped at ~20 words
+
+# Background discussions: the set keeps each task referenced until it finishes, the
+# semaphore bounds how many run at once (each holds LLM calls and a wait on Katrik)
+MAX_DISCUSSIONS = int(os.getenv("VITALIK_MAX_DISCUSSIONS", "4"))
+discussion_tasks: Set[asyncio.Task] = set()
+discussion_slots = asyncio.Semaphore(MAX_DISCUSSIONS)
+
+QUESTION_SYSTEM_MESSAGE = {"role": "system", "content": """You are Vitalik Buterin having a casual discussion. 
+                     Ask Katrik ONE short question about the NFT idea (max 15 words).
+                     Be conversational, like talking to a friend. No formal analysis."""}
+FINAL_TAKE_SYSTEM_MESSAGE = {"role": "system", "content": """You are Vitalik Buterin finishing a casual discussion with Katrik.
+                             Give your final take on the NFT idea (max 20 words).
+                             Be conversational and decisive, like concluding a chat with a friend."""}
+FINAL_TAKE_USER_TEMPLATE = "User wanted: {message}\n\nYou asked: {question}\n\nKatrik said: {answer}"
 
 # Agent addresses
 ETHERIUS_ADDRESS = "agent1q0vk6hezvvd89rwy0hdzaw2kertckqa40rae4a03jpsgvkye0dw8qyw3n7m"
@@ -40,117 +54,125 @@ async def startup(ctx: Context):
     ctx.logger.info(f"Vitalik Agent started with address: {agent.address}")
     ctx.logger.info(f"Listening on port: {os.getenv('VITALIK_PORT', 8202)}")
 
-@agent.on_message(model=BroadcastMessage)
-async def handle_broadcast(ctx: Context, sender: str, msg: BroadcastMessage):
-    ctx.logger.info(f"Vitalik received broadcast from {sender}")
-    ctx.logger.info(f"Original sender: {msg.original_sender}")
-    ctx.logger.info(f"Message: {msg.message}")
-    
-    # Only process messages from user (not from other agents)
-    if msg.original_sender != "user":
-        ctx.logger.info("Ignoring non-user message")
-        return
-    
+async def run_discussion(ctx: Context, msg: BroadcastMessage):
+    """Run the question → Katrik → final take discussion for one user message"""
     # Phase 1: Generate strategic question with ChatGPT
-    if OPENAI_API_KEY:
-        try:
-            ctx.logger.info("Phase 1: Generating strategic question...")
+    try:
+        ctx.logger.info("Phase 1: Generating strategic question...")
+        
+        # Generate question
+        data = {
+            "model": OPENAI_MODEL,
+            "max_completion_tokens": OPENAI_MAX_TOKENS,
+            "messages": [
+                QUESTION_SYSTEM_MESSAGE,
+                {"role": "user", "content": msg.message}
+            ]
+        }
+        
+        api_status, question = await chat_completion(data)
+        
+        if api_status == 200:
+            ctx.logger.info(f"Generated question: {question}")
             
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
+            # Small delay before broadcasting (thinking time)
+            await asyncio.sleep(2)
             
-            # Generate question
-            data = {
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {"role": "system", "content": """You are Vitalik Buterin having a casual discussion. 
-                     Ask Katrik ONE short question about the NFT idea (max 15 words).
-                     Be conversational, like talking to a friend. No formal analysis."""},
-                    {"role": "user", "content": msg.message}
-                ]
-            }
+            # Broadcast question to Etherius for display
+            broadcast_msg = BroadcastMessage(
+                message=question,
+                original_sender="vitalik"
+            )
+            await ctx.send(ETHERIUS_ADDRESS, broadcast_msg)
             
-            response = requests.post(OPENAI_API_URL, headers=headers, json=data)
+            # Small delay before sending to Katrik
+            await asyncio.sleep(1)
             
-            if response.status_code == 200:
-                question = response.json()['choices'][0]['message']['content']
-                ctx.logger.info(f"Generated question: {question}")
-                
-                # Small delay before broadcasting (thinking time)
-                await asyncio.sleep(2)
-                
-                # Broadcast question to Etherius for display
-                broadcast_msg = BroadcastMessage(
-                    message=question,
-                    original_sender="vitalik"
-                )
-                await ctx.send(ETHERIUS_ADDRESS, broadcast_msg)
+            # Send question to Katrik and wait for response
+            ctx.logger.info("Sending question to Katrik and waiting for response...")
+            idea_question = IdeaQuestion(
+                question=question,
+                original_message=msg.message
+            )
+            
+            katrik_response, status = await ctx.send_and_receive(
+                KATRIK_ADDRESS,
+                idea_question,
+                response_type=IdeaResponse,
+                timeout=30  # 30 second timeout
+            )
+            
+            if isinstance(katrik_response, IdeaResponse):
+                ctx.logger.info(f"Received response from Katrik: {katrik_response.response}")
                 
-                # Small delay before sending to Katrik
-                await asyncio.sleep(1)
+                # Phase 3: Synthesize final strategy
+                ctx.logger.info("Phase 3: Synthesizing final strategy...")
                 
-                # Send question to Katrik and wait for response
-                ctx.logger.info("Sending question to Katrik and waiting for response...")
-                idea_question = IdeaQuestion(
-                    question=question,
-                    original_message=msg.message
-                )
+                data = {
+                    "model": OPENAI_MODEL,
+                    "max_completion_tokens": OPENAI_MAX_TOKENS,
+                    "messages": [
+                        FINAL_TAKE_SYSTEM_MESSAGE,
+                        {"role": "user", "content": FINAL_TAKE_USER_TEMPLATE.format(
+                            message=msg.message, question=question, answer=katrik_response.response
+                        )}
+                    ]
+                }
                 
-                katrik_response, status = await ctx.send_and_receive(
-                    KATRIK_ADDRESS,
-                    idea_question,
-                    response_type=IdeaResponse,
-                    timeout=30  # 30 second timeout
-                )
+                api_status, final_strategy = await chat_completion(data)
                 
-                if isinstance(katrik_response, IdeaResponse):
-                    ctx.logger.info(f"Received response from Katrik: {katrik_response.response}")
-                    
-                    # Phase 3: Synthesize final strategy
-                    ctx.logger.info("Phase 3: Synthesizing final strategy...")
+                if api_status == 200:
+                    ctx.logger.info(f"Final strategy: {final_strategy}")
                     
-                    data = {
-                        "model": "gpt-4o-mini",
-                        "messages": [
-                            {"role": "system", "content": """You are Vitalik Buterin finishing a casual discussion with Katrik.
-                             Give your final take on the NFT idea (max 20 words).
-                             Be conversational and decisive, like concluding a chat with a friend."""},
-                            {"role": "user", "content": f"User wanted: {msg.message}\n\nYou asked: {question}\n\nKatrik said: {katrik_response.response}"}
-                        ]
-                    }
+                    # Small delay before final response
+                    await asyncio.sleep(2)
                     
-                    response = requests.post(OPENAI_API_URL, headers=headers, json=data)
-                    
-                    if response.status_code == 200:
-                        final_strategy = response.json()['choices'][0]['message']['content']
-                        ctx.logger.info(f"Final strategy: {final_strategy}")
-                        
-                        # Small delay before final response
-                        await asyncio.sleep(2)
-                        
-                        # Broadcast final strategy to Etherius
-                        final_msg = BroadcastMessage(
-                            message=final_strategy,
-                            original_sender="vitalik"
-                        )
-                        await ctx.send(ETHERIUS_ADDRESS, final_msg)
-                        ctx.logger.info("Final strategy sent to Etherius")
-                    else:
-                        ctx.logger.error(f"ChatGPT API error in phase 3: {response.status_code}")
+                    # Broadcast final strategy to Etherius
+                    final_msg = BroadcastMessage(
+                        message=final_strategy,
+                        original_sender="vitalik"
+                    )
+                    await ctx.send(ETHERIUS_ADDRESS, final_msg)
+                    ctx.logger.info("Final strategy sent to Etherius")
                 else:
-                    ctx.logger.error(f"Failed to receive response from Katrik: {status}")
+                    ctx.logger.error(f"ChatGPT API error in phase 3: {api_status} - {final_strategy}")
             else:
-                ctx.logger.error(f"ChatGPT API error in phase 1: {response.status_code}")
-        except Exception as e:
-            ctx.logger.error(f"Error in collaborative process: {e}")
-    else:
+                ctx.logger.error(f"Failed to receive response from Katrik: {status}")
+        else:
+            ctx.logger.error(f"ChatGPT API error in phase 1: {api_status} - {question}")
+    except Exception as e:
+        ctx.logger.error(f"Error in collaborative process: {e}")
+
+async def run_limited_discussion(ctx: Context, msg: BroadcastMessage):
+    """Run a discussion once one of the MAX_DISCUSSIONS slots is free"""
+    async with discussion_slots:
+        await run_discussion(ctx, msg)
+
+@agent.on_message(model=BroadcastMessage)
+async def handle_broadcast(ctx: Context, sender: str, msg: BroadcastMessage):
+    ctx.logger.info(f"Vitalik received broadcast from {sender}")
+    ctx.logger.info(f"Original sender: {msg.original_sender}")
+    ctx.logger.info(f"Message: {msg.message}")
+    
+    # Only process messages from user (not from other agents)
+    if msg.original_sender != "user":
+        ctx.logger.info("Ignoring non-user message")
+        return
+    
+    if not OPENAI_API_KEY:
         ctx.logger.warning("OpenAI API key not configured")
+        return
+    
+    # The discussion spans several LLM calls, pacing delays and a wait on Katrik,
+    # so run it in the background and leave the handler free for the next message
+    task = asyncio.create_task(run_limited_discussion(ctx, msg))
+    discussion_tasks.add(task)
+    task.add_done_callback(discussion_tasks.discard)
 
 @agent.on_event("shutdown")
 async def shutdown(ctx: Context):
     ctx.logger.info("Vitalik Agent shutting down")
+    await close_openai_session()
 
 if __name__ == "__main__":
     print("""
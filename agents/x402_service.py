@@ -6,11 +6,13 @@ Uses x402 middleware with Coinbase infrastructure
 
 import os
 import json
+import orjson
+import secrets
 from typing import Dict, Any
 from datetime import datetime
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from x402.fastapi.middleware import require_payment
 import logging
 
@@ -21,7 +23,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="x402 Payment Service", version="1.0.0")
+# Responses are encoded with orjson rather than the stdlib json encoder
+app = FastAPI(title="x402 Payment Service", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Store payment records
 payment_records: Dict[str, Any] = {}
@@ -32,15 +35,34 @@ NETWORK = os.getenv("X402_NETWORK", "base-sepolia")
 FACILITATOR_URL = os.getenv("X402_FACILITATOR_URL", "https://x402.org/facilitator")
 DEFAULT_PRICE = 0.01  # Default price in USD
 
+# Bodies that only depend on the configuration above, encoded once at startup
+HEALTH_BODY = orjson.dumps({
+    "status": "healthy",
+    "service": "x402 Payment Service",
+    "network": NETWORK,
+    "wallet": WALLET_ADDRESS[:6] + "..." + WALLET_ADDRESS[-4:]
+})
+PAYMENT_REQUIRED_BODY = orjson.dumps({
+    "error": "Payment Required",
+    "message": "This endpoint requires payment via x402",
+    "payment_instructions": {
+        "network": NETWORK,
+        "pay_to": WALLET_ADDRESS,
+        "amount": DEFAULT_PRICE,
+        "currency": "USDC",
+        "facilitator": FACILITATOR_URL
+    }
+})
+PAYMENT_REQUIRED_HEADERS = {
+    "X-Payment-Required": "true",
+    "X-Payment-Network": NETWORK,
+    "X-Payment-Address": WALLET_ADDRESS
+}
+
 # Health check endpoint (no payment required)
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "service": "x402 Payment Service",
-        "network": NETWORK,
-        "wallet": WALLET_ADDRESS[:6] + "..." + WALLET_ADDRESS[-4:]
-    }
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 # Apply x402 payment middleware to specific paths
 app.middleware("http")(
@@ -102,11 +124,8 @@ async def create_payment_request(nft_name: str = "NFT", price: float = DEFAULT_P
     """
     Create a new payment request with x402 instructions
     """
-    import hashlib
-    import time
-    
     # Generate unique payment ID
-    payment_id = hashlib.sha256(f"{nft_name}{time.time()}".encode()).hexdigest()[:8]
+    payment_id = secrets.token_hex(4)
     
     # Return payment instructions
     return {
@@ -146,24 +165,11 @@ async def clear_payments():
 @app.exception_handler(402)
 async def payment_required_handler(request: Request, exc: HTTPException):
     """Handle 402 Payment Required responses"""
-    return JSONResponse(
+    return Response(
+        content=PAYMENT_REQUIRED_BODY,
         status_code=402,
-        content={
-            "error": "Payment Required",
-            "message": "This endpoint requires payment via x402",
-            "payment_instructions": {
-                "network": NETWORK,
-                "pay_to": WALLET_ADDRESS,
-                "amount": DEFAULT_PRICE,
-                "currency": "USDC",
-                "facilitator": FACILITATOR_URL
-            }
-        },
-        headers={
-            "X-Payment-Required": "true",
-            "X-Payment-Network": NETWORK,
-            "X-Payment-Address": WALLET_ADDRESS
-        }
+        media_type="application/json",
+        headers=PAYMENT_REQUIRED_HEADERS
     )
 
 if __name__ == "__main__":